@@ -0,0 +1,75 @@
+# bench/corpus.py
+"""Детерминированный генератор синтетической базы заметок."""
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+from pathlib import Path
+
+from pkm.core.db import Database
+from pkm.core import transfer
+
+SEED = 20240601
+TAGS = 2000
+VOCABULARY = 30000
+REMINDER_RATE = 0.05
+START = datetime(2022, 1, 1)
+DAYS = 3 * 365
+
+SYLLABLES = ("ка", "ло", "ми", "ре", "то", "на", "су", "ви", "де", "ра",
+             "по", "ли", "ко", "ту", "ше", "ба", "го", "зи", "ны", "ха")
+
+
+def zipf_weights(n: int, s: float = 1.1):
+    return list(accumulate(1 / (k ** s) for k in range(1, n + 1)))
+
+
+def make_words(rnd, n: int):
+    words = set()
+    while len(words) < n:
+        words.add("".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+
+def generate(count: int, seed: int = SEED):
+    """Поток записей в формате transfer.import_notes."""
+    rnd = random.Random(seed)
+    words = make_words(rnd, VOCABULARY)
+    tags = [f"тег{i}" for i in range(TAGS)]
+    word_weights = zipf_weights(len(words))
+    tag_weights = zipf_weights(len(tags), 1.3)
+
+    for i in range(count):
+        created = START + timedelta(seconds=rnd.randrange(DAYS * 86400))
+        # длины текстов примерно логнормальные: много коротких, редкие длинные
+        length = min(int(rnd.lognormvariate(4.0, 1.0)) + 1, 5000)
+        title = " ".join(rnd.choices(words, cum_weights=word_weights, k=rnd.randint(1, 5)))
+        content = " ".join(rnd.choices(words, cum_weights=word_weights, k=length))
+        note_tags = set(rnd.choices(tags, cum_weights=tag_weights, k=rnd.choice((0, 1, 1, 2, 2, 3, 4, 6))))
+
+        rems = []
+        if rnd.random() < REMINDER_RATE:
+            at = created + timedelta(days=rnd.randint(-30, 400), seconds=rnd.randrange(86400))
+            rems.append({"remind_at": at.strftime("%Y-%m-%d %H:%M:%S"),
+                         "sent": at < START + timedelta(days=DAYS)})
+
+        yield {
+            "title": title.capitalize(),
+            "content": content,
+            "created": created.strftime("%Y-%m-%d %H:%M:%S"),
+            "tags": sorted(note_tags),
+            "reminders": rems,
+        }
+
+
+def build(path, count: int, seed: int = SEED, progress=None) -> Database:
+    """Открывает готовую базу или строит её заново (тот же seed -- та же база)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = Database(str(path))
+    key = f"corpus:{seed}:{count}"
+    built = db.execute("SELECT 1 FROM app_settings WHERE key = ?", (key,)).fetchone()
+    # прерванная генерация докатывается с места остановки
+    if not built:
+        transfer.import_notes(db, generate(count, seed), key=key, resume=True, progress=progress)
+        db.execute("INSERT OR REPLACE INTO app_settings(key, value) VALUES(?, ?)", (key, str(count)))
+    return db
@@ -0,0 +1,233 @@
+# bench/run.py
+"""Замеры горячих путей на синтетических базах.
+
+    python -m bench.run --sizes 10000 100000 --repeat 20
+    python -m bench.run --compare bench/results/old.json
+
+Работает без дисплея: Qt не импортируется, замеряются те же запросы,
+которые выполняют окно и напоминания.
+"""
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from bench import corpus
+from pkm.core.db import PAGE_SIZE
+from pkm.core.duplicates import Duplicates
+from pkm.core.notes import NoteService
+from pkm.core.related import Related
+from pkm.core.revisions import Revisions
+from pkm.core.trigram import TrigramIndex
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def timed(fn, repeat: int, warmup: int = 2) -> dict:
+    for _ in range(warmup):
+        fn()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    runs.sort()
+    return {
+        "median_ms": round(statistics.median(runs), 4),
+        "p95_ms": round(runs[min(len(runs) - 1, int(len(runs) * 0.95))], 4),
+        "min_ms": round(runs[0], 4),
+        "runs": repeat,
+    }
+
+
+def cases(db, rnd):
+    ids = [r[0] for r in db.execute("SELECT id FROM notes ORDER BY random() LIMIT 200")]
+    days = [r[0] for r in db.execute("SELECT created_date FROM notes "
+                                     "WHERE id IN (%s)" % ",".join(map(str, ids[:50])))]
+    tag = db.execute("SELECT t.name FROM tags t JOIN note_tags nt ON nt.tag_id = t.id "
+                     "GROUP BY t.id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    word = db.execute("SELECT title FROM notes WHERE id = ?", (ids[0],)).fetchone()[0].split()[0]
+    first = db.find_notes("", "", True)
+    last = first[-1] if len(first) == PAGE_SIZE else None
+    due = [r[0] for r in db.execute("SELECT id FROM reminders LIMIT 50")]
+
+    def pick(seq):
+        return seq[rnd.randrange(len(seq))]
+
+    def hydrate_cold():
+        db.cache.items.clear()
+        db.load_note(pick(ids))
+
+    def hydrate_legacy():
+        note_id = pick(ids)
+        db.get_note(note_id)
+        db.get_tags(note_id)
+        db.get_rem(note_id)
+
+    def set_tags():
+        note_id = pick(ids)
+        tags = db.get_tags(note_id)
+        db.set_tags(note_id, [f"bench{i}" for i in range(30)])
+        db.set_tags(note_id, tags)
+
+    # сохраняем тем же путём, что и окно: с похожими, ссылками,
+    # историей и подписями дубликатов в одной транзакции
+    service = NoteService(db)
+
+    def save_cycle():
+        note_id, _ = service.save(None, "bench note", "bench " * 200,
+                                  ["bench", "тест"], "2030-01-01 10:00:00")
+        service.save(note_id, "bench note 2", "bench " * 201, ["bench"], None)
+        service.delete(note_id)
+
+    lines = [f"строка {i} " + "текст " * (i % 12) for i in range(60_000)]
+    big_id, _ = service.save(None, "bench big", "\n".join(lines), [])
+
+    def big_edit():
+        i = rnd.randrange(len(lines))
+        lines[i] += " правка"
+        service.save(big_id, "bench big", "\n".join(lines), [])
+
+    revisions = Revisions(db)
+
+    def big_revision():
+        before = "\n".join(lines)
+        i = rnd.randrange(len(lines))
+        lines[i] += " версия"
+        revisions.record(big_id, "bench big", "\n".join(lines), ("bench big", before))
+
+    def big_history():
+        revision_id = revisions.history(big_id)[0][0]
+        revisions.text(revision_id)
+
+    # векторы строятся один раз и остаются в базе корпуса
+    related = Related(db)
+    while related.backfill(5000):
+        pass
+
+    duplicates = Duplicates(db)
+    while duplicates.backfill(5000):
+        pass
+    texts = [db.note_text(db.load_note(i)) for i in ids[:50]]
+
+    switcher = TrigramIndex.build(db.execute("SELECT id, title FROM notes").fetchall(),
+                                  [r[0] for r in db.execute("SELECT name FROM tags")])
+    titles = [r[0] for r in db.execute("SELECT title FROM notes WHERE id IN (%s)"
+                                       % ",".join(map(str, ids)))]
+
+    def typo(title):
+        # выпавшая буква в случайном месте
+        cut = rnd.randrange(len(title))
+        return title[:cut] + title[cut + 1:]
+
+    def big_open():
+        db.cache.invalidate(big_id)
+        note = db.load_note(big_id)
+        db.read_chunk(note.chunks[0])
+
+    return {
+        "load_date": lambda: db.find_notes("", pick(days), False),
+        "load_all": lambda: db.find_notes("", "", True),
+        "load_all_page2": lambda: db.find_notes("", "", True, after=(last[4], last[0])) if last else None,
+        "load_title": lambda: db.find_notes(word, "", True),
+        "load_title_date": lambda: db.find_notes(word, pick(days), False),
+        "load_tag": lambda: db.find_notes(f"#{tag}", "", True),
+        "hydrate_legacy": hydrate_legacy,
+        "hydrate_cold": hydrate_cold,
+        "hydrate_warm": lambda: db.load_note(ids[0]),
+        "calendar_month": lambda: db.day_counts(pick(days)[:8] + "01", pick(days)[:8] + "31"),
+        "reminders_startup": db.pending_rems,
+        "reminders_due": lambda: db.get_rems_by_id(due),
+        "set_tags_30": set_tags,
+        "save_update_delete": save_cycle,
+        "related": lambda: related.similar(pick(ids)),
+        "duplicates_find": lambda: duplicates.find(pick(texts)),
+        "switcher_typo": lambda: switcher.search(typo(pick(titles))),
+        "big_note_open": big_open,
+        "big_note_edit": big_edit,
+        "big_note_revision": big_revision,
+        "big_note_history": big_history,
+    }
+
+
+def run(sizes, data: Path, repeat: int, seed: int) -> dict:
+    results = {}
+    for size in sizes:
+        print(f"[{size}] база...", file=sys.stderr)
+        start = time.perf_counter()
+        db = corpus.build(data / f"corpus-{size}.sqlite3", size, seed,
+                          progress=lambda n: print(f"\r  {n}", end="", file=sys.stderr))
+        built = time.perf_counter() - start
+        print(f"\n  готова за {built:.1f} с", file=sys.stderr)
+
+        rnd = random.Random(seed)
+        size_results = {}
+        for name, fn in cases(db, rnd).items():
+            size_results[name] = timed(fn, repeat)
+            print(f"  {name:20} {size_results[name]['median_ms']:10.3f} ms", file=sys.stderr)
+        results[str(size)] = size_results
+        db.close()
+    return results
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old: dict, new: dict):
+    for size, cases_ in new["results"].items():
+        for name, stats in cases_.items():
+            before = old.get("results", {}).get(size, {}).get(name)
+            if not before:
+                continue
+            change = (stats["median_ms"] / before["median_ms"] - 1) * 100 if before["median_ms"] else 0
+            flag = "  <-- регрессия" if change > 10 else ""
+            print(f"{size:>8} {name:20} {before['median_ms']:10.3f} -> "
+                  f"{stats['median_ms']:10.3f} ms ({change:+.1f}%){flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bench")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=corpus.SEED)
+    parser.add_argument("--data", type=Path, default=Path("bench/data"))
+    parser.add_argument("--out", type=Path)
+    parser.add_argument("--compare", type=Path, help="JSON прошлого прогона")
+    args = parser.parse_args(argv)
+
+    rev = commit()
+    report = {
+        "meta": {
+            "commit": rev,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": run(args.sizes, args.data, args.repeat, args.seed),
+    }
+
+    out = args.out or Path("bench/results") / f"{rev}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"результаты: {out}", file=sys.stderr)
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import time
+START = time.perf_counter()
+
+import argparse
+import sys
+from pathlib import Path
+from pkm.core.db import Database
+from pkm.core.timing import Startup
+from pkm.core import backup, transfer
+from pkm.core.codec import Compressor
+from pkm.core.duplicates import THRESHOLD, Duplicates
+from pkm.core.related import Related
+
+
+def non_negative(text):
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("нужно неотрицательное число")
+    return value
+
+
+def progress(count):
+    print(f"\r{count}", end="", file=sys.stderr, flush=True)
+
+
+def cmd_export(db, args):
+    if args.format == "jsonl":
+        count = transfer.export_jsonl(db, args.path, progress)
+    else:
+        count = transfer.export_markdown(db, args.path, progress)
+    print(f"\nЭкспортировано заметок: {count}", file=sys.stderr)
+
+
+def cmd_import(db, args):
+    if args.format == "jsonl":
+        notes = transfer.read_jsonl(args.path)
+    else:
+        notes = transfer.read_markdown(
+            args.path, lambda path, error: print(f"\nПропущен {path}: {error}", file=sys.stderr))
+    # позиция пишется всегда, --resume только решает, продолжать ли с неё
+    key = str(Path(args.path).resolve())
+    count = transfer.import_notes(db, notes, key=key, resume=args.resume, progress=progress)
+    print(f"\nИмпортировано заметок: {count}", file=sys.stderr)
+
+
+def cmd_reindex(db, args):
+    Related(db).rebuild(lambda: transfer.iter_notes(db), progress)
+    print("\nИндекс похожих заметок пересчитан", file=sys.stderr)
+
+
+def cmd_compress(db, args):
+    compressor = Compressor(db)
+    compressor.train()
+    done = 0
+    while True:
+        count = compressor.backfill(5000)
+        if not count:
+            break
+        done += count
+        progress(done)
+    # освободившиеся страницы возвращаются файлу только после VACUUM
+    db.execute("VACUUM")
+    print("\nЗаметки сжаты", file=sys.stderr)
+
+
+def cmd_duplicates(db, args):
+    duplicates = Duplicates(db)
+    done = 0
+    while True:
+        count = duplicates.backfill(5000)
+        if not count:
+            break
+        done += count
+        progress(done)
+    groups = duplicates.report(args.threshold)
+    for group in groups:
+        print()
+        for note_id, title, created, score in group:
+            print(f"{score:4.0%}  {note_id:>8}  {created[:10]}  {title}")
+    print(f"\nГрупп повторов: {len(groups)}", file=sys.stderr)
+
+
+def cmd_backup(db, args):
+    path = backup.snapshot(db.db_path, args.folder, args.keep,
+                           progress=lambda remaining, total: progress(f"{total - remaining}/{total}"))
+    print(f"\nКопия снята: {path}", file=sys.stderr)
+
+
+def cmd_restore(db, args):
+    if not args.path:
+        for path in backup.snapshots(args.folder):
+            print(path)
+        return
+    # соединение приложения держит файл и WAL, перед заменой его закрываем
+    db.close()
+    aside = backup.restore(args.path, db.db_path)
+    print(f"База восстановлена из {args.path}", file=sys.stderr)
+    if aside:
+        print(f"Прежняя база сохранена как {aside}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pkm")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="выгрузить все заметки")
+    p.add_argument("path")
+    p.add_argument("--format", choices=("jsonl", "md"), default="jsonl")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="загрузить заметки")
+    p.add_argument("path")
+    p.add_argument("--format", choices=("jsonl", "md"), default="jsonl")
+    p.add_argument("--resume", action="store_true",
+                   help="продолжить прерванный импорт этого файла")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("reindex", help="пересчитать индекс похожих заметок")
+    p.set_defaults(func=cmd_reindex)
+
+    p = sub.add_parser("compress", help="сжать тексты заметок и уменьшить файл базы")
+    p.set_defaults(func=cmd_compress)
+
+    p = sub.add_parser("duplicates", help="найти повторяющиеся и почти одинаковые заметки")
+    p.add_argument("--threshold", type=float, default=THRESHOLD,
+                   help="порог сходства от 0 до 1")
+    p.set_defaults(func=cmd_duplicates)
+
+    p = sub.add_parser("backup", help="снять резервную копию базы")
+    p.add_argument("--folder", default=backup.BACKUP_DIR)
+    p.add_argument("--keep", type=non_negative, default=backup.KEEP,
+                   help="сколько последних копий хранить")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("restore", help="восстановить базу из копии; без пути -- список копий")
+    p.add_argument("path", nargs="?")
+    p.add_argument("--folder", default=backup.BACKUP_DIR)
+    p.set_defaults(func=cmd_restore)
+
+    args = parser.parse_args(argv)
+    startup = Startup("cli", START)
+    db = Database()
+    startup.mark("db_ready")
+    try:
+        args.func(db, args)
+    finally:
+        db.close()
+        startup.mark("done")
+        startup.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,39 @@
+import time
+START = time.perf_counter()
+
 import sys
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication, QDialog
-from db import Database
-from origin.window import MainWindow
+from pkm.core.db import Database
+from pkm.core.timing import Startup
 from origin.dialog import Password
-from reminders import Reminder
 
 
 def main():
+    startup = Startup("gui", START)
     app = QApplication(sys.argv)
     db = Database()
+    startup.mark("db_ready")
+
     check = Password(db)
+    QTimer.singleShot(0, lambda: startup.mark("password_shown"))
     if check.exec() != QDialog.DialogCode.Accepted:
         sys.exit(0)
 
-
+    # главное окно тянет за собой весь остальной GUI: строим его только после входа
+    begin = time.perf_counter()
+    from origin.window import MainWindow
     window = MainWindow(db)
     window.show()
-    rem = Reminder(db, window)
 
+    def first_paint():
+        # отсчёт от входа: время ввода пароля в замер не попадает
+        startup.mark("window_painted", since=begin)
+        startup.report()
+
+    QTimer.singleShot(0, first_paint)
     app.exec()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
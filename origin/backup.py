@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import time
+
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal
+
+from pkm.core.backup import BackupError, snapshot, snapshots
+
+# первая проверка -- когда окно уже открылось и всё загружено
+START_DELAY_MS = 60_000
+# раз в час смотрим, не пора ли: таймер переживает сон ноутбука
+CHECK_MS = 3_600_000
+EVERY = 24 * 3600
+
+
+class Backup(QThread):
+    """Раз в сутки снимает копию базы в фоне.
+
+    Копирование идёт порциями через своё соединение, так что окно и
+    сохранение заметок в это время не ждут.
+    """
+
+    done = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.timer = QTimer(self)
+        self.timer.setInterval(CHECK_MS)
+        self.timer.timeout.connect(self.check)
+        QTimer.singleShot(START_DELAY_MS, self.check)
+        self.timer.start()
+
+    def check(self):
+        if self.isRunning():
+            return
+        last = snapshots()
+        if not last or time.time() - os.path.getmtime(last[-1]) >= EVERY:
+            self.start(QThread.Priority.LowPriority)
+
+    def run(self):
+        try:
+            path = snapshot(self.db_path, cancelled=self.isInterruptionRequested)
+        except (BackupError, sqlite3.Error, OSError) as e:
+            if not self.isInterruptionRequested():
+                self.failed.emit(str(e))
+            return
+        self.done.emit(str(path))
+
+    def stop(self):
+        self.timer.stop()
+        self.requestInterruption()
+        self.wait()
@@ -0,0 +1,35 @@
+import sqlite3
+
+from PyQt6.QtCore import QThread
+
+from pkm.core.codec import Compressor
+from pkm.core.db import Database
+
+COMPRESS_BATCH = 500
+
+
+class Compress(QThread):
+    """Сжимает старые и импортированные заметки пачками, через своё
+    соединение и короткими транзакциями, как Backfill похожих."""
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+
+    def run(self):
+        db = Database(self.db_path)
+        try:
+            compressor = Compressor(db)
+            compressor.train()
+            while not self.isInterruptionRequested() and compressor.backfill(COMPRESS_BATCH):
+                pass
+        except sqlite3.OperationalError:
+            # база занята дольше busy_timeout; позиция сохранена, продолжим
+            # при следующем запуске. Исключение из run() PyQt не прощает
+            pass
+        finally:
+            db.close()
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
@@ -0,0 +1,141 @@
+from collections import deque
+from datetime import datetime
+from PyQt6.QtCore import QTimer, Qt
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTableWidget, QTableWidgetItem,
+    QListWidget, QListWidgetItem, QTextEdit, QPushButton, QSplitter, QHeaderView
+)
+import pyqtgraph as pg
+
+from pkm.core.instrument import BUCKETS
+
+HISTORY = 120
+
+
+class Diagnostics(QWidget):
+    """Живая статистика запросов к базе."""
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent, Qt.WindowType.Window)
+        self.db = db
+        self.stats = db.enable_stats()
+        self.setWindowTitle("Диагностика запросов")
+        self.resize(900, 700)
+
+        self.last = self.stats.snapshot()
+        self.newest_slow = None
+        self.qps = deque([0] * HISTORY, maxlen=HISTORY)
+        self.cps = deque([0] * HISTORY, maxlen=HISTORY)
+        self.avg = deque([0] * HISTORY, maxlen=HISTORY)
+
+        self._build()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+
+    def _build(self):
+        layout = QVBoxLayout(self)
+
+        top = QHBoxLayout()
+        self.summary = QLabel()
+        top.addWidget(self.summary, 1)
+        btn_reset = QPushButton("Сбросить")
+        btn_reset.clicked.connect(self.on_reset)
+        top.addWidget(btn_reset)
+        layout.addLayout(top)
+
+        plots = QHBoxLayout()
+        layout.addLayout(plots, 1)
+
+        self.rate_plot = pg.PlotWidget(title="Запросов и коммитов в секунду")
+        self.rate_plot.addLegend()
+        self.q_curve = self.rate_plot.plot(pen=pg.mkPen("#2e86de", width=2), name="запросы")
+        self.c_curve = self.rate_plot.plot(pen=pg.mkPen("#e67e22", width=2), name="коммиты")
+        plots.addWidget(self.rate_plot)
+
+        self.latency_plot = pg.PlotWidget(title="Средняя задержка, мс")
+        self.avg_curve = self.latency_plot.plot(pen=pg.mkPen("#27ae60", width=2))
+        plots.addWidget(self.latency_plot)
+
+        self.hist_plot = pg.PlotWidget(title="Гистограмма задержек")
+        labels = [f"≤{b}" for b in BUCKETS] + [f">{BUCKETS[-1]}"]
+        self.hist_plot.getAxis("bottom").setTicks([list(enumerate(labels))])
+        self.bars = pg.BarGraphItem(x=list(range(len(labels))), height=[0] * len(labels),
+                                    width=0.8, brush="#8e44ad")
+        self.hist_plot.addItem(self.bars)
+        plots.addWidget(self.hist_plot)
+
+        split = QSplitter(Qt.Orientation.Vertical)
+        layout.addWidget(split, 2)
+
+        self.top_sql = QTableWidget(0, 5)
+        self.top_sql.setHorizontalHeaderLabels(["Запрос", "Раз", "Всего, мс", "Макс, мс", "Строк"])
+        self.top_sql.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.top_sql.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        split.addWidget(self.top_sql)
+
+        slow = QSplitter(Qt.Orientation.Horizontal)
+        self.slow_list = QListWidget()
+        self.slow_list.currentItemChanged.connect(self.on_slow_selected)
+        self.plan = QTextEdit()
+        self.plan.setReadOnly(True)
+        slow.addWidget(self.slow_list)
+        slow.addWidget(self.plan)
+        split.addWidget(slow)
+
+    def refresh(self):
+        snap = self.stats.snapshot()
+        queries = snap["queries"] - self.last["queries"]
+        spent = snap["total_ms"] - self.last["total_ms"]
+        self.qps.append(queries)
+        self.cps.append(snap["commits"] - self.last["commits"])
+        self.avg.append(spent / queries if queries else 0)
+        self.last = snap
+
+        self.q_curve.setData(list(self.qps))
+        self.c_curve.setData(list(self.cps))
+        self.avg_curve.setData(list(self.avg))
+        self.bars.setOpts(height=snap["histogram"])
+
+        cache = self.db.cache.stats()
+        self.summary.setText(
+            f"Запросов: {snap['queries']}  строк: {snap['rows']}  "
+            f"коммитов: {snap['commits']}  откатов: {snap['rollbacks']}  "
+            f"кэш заметок: {cache['hits']}/{cache['hits'] + cache['misses']}"
+        )
+
+        top = self.stats.top(30)
+        self.top_sql.setRowCount(len(top))
+        for row, (sql, entry) in enumerate(top):
+            values = (sql, entry["count"], f"{entry['total_ms']:.1f}",
+                      f"{entry['max_ms']:.1f}", entry["rows"])
+            for col, value in enumerate(values):
+                self.top_sql.setItem(row, col, QTableWidgetItem(str(value)))
+
+        newest = snap["slow"][-1]["time"] if snap["slow"] else None
+        if newest != self.newest_slow:
+            self.newest_slow = newest
+            self.slow_list.clear()
+            for entry in reversed(snap["slow"]):
+                when = datetime.fromtimestamp(entry["time"]).strftime("%H:%M:%S")
+                item = QListWidgetItem(f"{when}  {entry['ms']:.1f} мс  {entry['sql'][:80]}")
+                item.setData(Qt.ItemDataRole.UserRole, entry)
+                self.slow_list.addItem(item)
+
+    def on_slow_selected(self, item, _previous=None):
+        if not item:
+            self.plan.clear()
+            return
+        entry = item.data(Qt.ItemDataRole.UserRole)
+        self.plan.setPlainText(
+            f"{entry['sql']}\n\nпараметры: {entry['params']}\n"
+            f"время: {entry['ms']:.2f} мс, строк: {entry['rows']}\n\n"
+            "EXPLAIN QUERY PLAN:\n" + "\n".join(entry["plan"])
+        )
+
+    def on_reset(self):
+        self.stats.reset()
+        self.last = self.stats.snapshot()
+        self.newest_slow = None
+        self.slow_list.clear()
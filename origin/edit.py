@@ -1,6 +1,8 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QTextEdit, QPushButton
 from datetime import datetime
 
+from origin.highlight import CodeHighlighter
+
 
 
 
@@ -19,6 +21,7 @@ class NoteEditorWidget(QWidget):
         self.layout = QVBoxLayout(self)
         self.title = QLineEdit(self)
         self.body = QTextEdit(self)
+        self.highlighter = CodeHighlighter(self.body.document())
         self.save_btn = QPushButton("Save", self)
         self.delete_btn = QPushButton("Delete", self)
 
@@ -0,0 +1,98 @@
+import math
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import QLabel, QVBoxLayout, QWidget
+import numpy as np
+import pyqtgraph as pg
+
+CENTER_BRUSH = "#e67e22"
+NODE_BRUSH = "#2e86de"
+OPENED_BRUSH = "#27ae60"
+
+
+class GraphView(QWidget):
+    """Окрестность заметки в графе ссылок.
+
+    Граф целиком не грузится: показываются соседи выбранной заметки,
+    щелчок по узлу дочитывает его соседей и открывает заметку.
+    """
+
+    chosen = pyqtSignal(int)
+
+    def __init__(self, links, parent=None):
+        super().__init__(parent, Qt.WindowType.Window)
+        self.links = links
+        self.setWindowTitle("Граф связей")
+        self.resize(800, 600)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Щелчок по узлу раскрывает его связи и открывает заметку"))
+        self.plot = pg.PlotWidget()
+        self.plot.hideAxis("left")
+        self.plot.hideAxis("bottom")
+        self.plot.setAspectLocked(True)
+        layout.addWidget(self.plot)
+
+        self.graph = pg.GraphItem()
+        self.graph.scatter.sigClicked.connect(self.on_clicked)
+        self.plot.addItem(self.graph)
+        self.reset()
+
+    def reset(self):
+        for label in getattr(self, "labels", ()):
+            self.plot.removeItem(label)
+        self.ids = []
+        self.index = {}
+        self.pos = []
+        self.labels = []
+        self.edges = set()
+        self.expanded = set()
+
+    def show_note(self, note_id, title):
+        self.reset()
+        self._add(note_id, title, (0.0, 0.0))
+        self.expand(note_id)
+        self.plot.autoRange()
+
+    def expand(self, note_id):
+        if note_id in self.expanded:
+            return
+        self.expanded.add(note_id)
+
+        cx, cy = self.pos[self.index[note_id]]
+        neighbors = self.links.neighbors(note_id)
+        fresh = [n for n in neighbors if n[0] not in self.index]
+        radius = max(1.0, len(fresh) / 6)
+        # от центра графа наружу, чтобы кольца соседей меньше налезали
+        base = math.atan2(cy, cx) if (cx or cy) else 0.0
+        spread = 2 * math.pi if not (cx or cy) else math.pi
+        for i, (other, title, _) in enumerate(fresh):
+            angle = base - spread / 2 + spread * (i + 0.5) / len(fresh)
+            self._add(other, title, (cx + radius * math.cos(angle), cy + radius * math.sin(angle)))
+
+        for other, _, outgoing in neighbors:
+            edge = (note_id, other) if outgoing else (other, note_id)
+            self.edges.add((self.index[edge[0]], self.index[edge[1]]))
+        self._draw()
+
+    def _add(self, note_id, title, pos):
+        self.index[note_id] = len(self.ids)
+        self.ids.append(note_id)
+        self.pos.append(pos)
+        label = pg.TextItem(title or "", anchor=(0.5, -0.4))
+        label.setPos(*pos)
+        self.plot.addItem(label)
+        self.labels.append(label)
+
+    def _draw(self):
+        brushes = [CENTER_BRUSH if i == 0 else OPENED_BRUSH if note_id in self.expanded else NODE_BRUSH
+                   for i, note_id in enumerate(self.ids)]
+        adj = np.array(sorted(self.edges), dtype=int) if self.edges else None
+        self.graph.setData(pos=np.array(self.pos, dtype=float), adj=adj, size=14,
+                           symbolBrush=brushes, pxMode=True)
+
+    def on_clicked(self, _scatter, points, *_):
+        if not len(points):
+            return
+        note_id = self.ids[points[0].index()]
+        self.expand(note_id)
+        self.chosen.emit(note_id)
@@ -0,0 +1,74 @@
+import calendar
+from PyQt6.QtCore import QDate
+from PyQt6.QtGui import QColor, QTextCharFormat, QFont
+
+from pkm.core.events import NOTE_EVENTS
+from pkm.core.schedule import valid
+
+# фон дня по числу заметок: 1, 2-3, 4-7, 8+
+SHADES = ("#e3f2e1", "#bfe3ba", "#8fcf87", "#5bb351")
+REMINDER_COLOR = "#c0392b"
+
+
+class CalendarHeatmap:
+    """Подсветка дней календаря по числу заметок и напоминаний.
+
+    Месяц запрашивается одним GROUP BY и дальше живёт в кэше, который
+    правится на месте при сохранении и удалении заметок.
+    """
+
+    def __init__(self, db, calendar_widget):
+        self.db = db
+        self.calendar = calendar_widget
+        self.months = {}
+        self.calendar.currentPageChanged.connect(self.paint)
+        db.events.subscribe(self.on_event, *NOTE_EVENTS)
+        self.paint(self.calendar.yearShown(), self.calendar.monthShown())
+
+    def month(self, year: int, month: int) -> dict:
+        key = (year, month)
+        if key not in self.months:
+            last = calendar.monthrange(year, month)[1]
+            self.months[key] = self.db.day_counts(f"{year:04d}-{month:02d}-01",
+                                                  f"{year:04d}-{month:02d}-{last:02d}")
+        return self.months[key]
+
+    def paint(self, year: int, month: int):
+        # пустая дата сбрасывает форматы всех дней
+        self.calendar.setDateTextFormat(QDate(), QTextCharFormat())
+        for day, (notes, rems) in self.month(year, month).items():
+            fmt = QTextCharFormat()
+            if notes:
+                level = min(notes.bit_length(), len(SHADES)) - 1
+                fmt.setBackground(QColor(SHADES[level]))
+            if rems:
+                fmt.setForeground(QColor(REMINDER_COLOR))
+                fmt.setFontWeight(QFont.Weight.Bold)
+            self.calendar.setDateTextFormat(QDate.fromString(day, "yyyy-MM-dd"), fmt)
+
+    def on_event(self, event):
+        touched = set()
+        if event.before:
+            touched |= self._add(event.before, -1)
+        if event.after:
+            touched |= self._add(event.after, 1)
+
+        shown = (self.calendar.yearShown(), self.calendar.monthShown())
+        if shown in touched:
+            self.paint(*shown)
+
+    def _add(self, note, sign):
+        touched = set()
+        # day_counts тоже не считает напоминания с временем не в DATE_FMT
+        days = [(note.created[:10], 0)] + [(r[1][:10], 1) for r in note.rems if valid(r[1])]
+        for day, column in days:
+            key = (int(day[:4]), int(day[5:7]))
+            counts = self.months.get(key)
+            if counts is None:
+                continue
+            entry = counts.setdefault(day, [0, 0])
+            entry[column] += sign
+            if entry == [0, 0]:
+                del counts[day]
+            touched.add(key)
+        return touched
@@ -0,0 +1,178 @@
+import time
+from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import (
+    QColor, QFont, QFontDatabase, QSyntaxHighlighter, QTextBlockUserData, QTextCharFormat,
+    QTextLayout
+)
+from pygments.styles import get_style_by_name
+
+from pkm.core.codelex import LineLexer, fence_close, fence_open
+
+# на одно событие редактора, чтобы не выйти за кадр (16 мс)
+BUDGET = 0.008
+PROSE = -1
+
+
+class BlockCache(QTextBlockUserData):
+    """Разбор строки: с каким состоянием и текстом он сделан, что вышло."""
+
+    def __init__(self, key, formats, state):
+        super().__init__()
+        self.key = key
+        self.formats = formats
+        self.state = state
+
+
+class CodeHighlighter(QSyntaxHighlighter):
+    """Подсветка fenced-блоков кода (```lang ... ```) через Pygments.
+
+    Состояние строки -- номер тройки (маркер, язык, стек лексера), так
+    что Qt сам перелексирует только изменённые строки и те, у которых
+    от этого поменялось входное состояние. Остальное делается порциями:
+    если разбор за одно событие не уложился в BUDGET, оставшиеся строки
+    сохраняют прежнюю подсветку, а досчитывает их фоновый проход.
+    Строки выше frontier разобраны точно.
+    """
+
+    def __init__(self, document, style: str = "default"):
+        super().__init__(document)
+        self.lexer = LineLexer()
+        self.style = get_style_by_name(style)
+        self.formats = {}
+        self.keys = []
+        self.ids = {}
+        self.frontier = 0
+        self.blocks = document.blockCount()
+        self.started = None
+
+        mono = QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont)
+        self.code = QTextCharFormat()
+        self.code.setFontFamilies([mono.family()])
+        self.fence = QTextCharFormat(self.code)
+        self.fence.setForeground(QColor("#888888"))
+
+        self.background = QTimer(self)
+        self.background.setInterval(0)
+        self.background.timeout.connect(self._continue)
+        document.contentsChange.connect(self._changed)
+
+    def _state(self, key) -> int:
+        if key not in self.ids:
+            self.ids[key] = len(self.keys)
+            self.keys.append(key)
+        return self.ids[key]
+
+    def _format(self, ttype) -> QTextCharFormat:
+        fmt = self.formats.get(ttype)
+        if fmt is None:
+            style = self.style.style_for_token(ttype)
+            fmt = QTextCharFormat(self.code)
+            if style["color"]:
+                fmt.setForeground(QColor("#" + style["color"]))
+            if style["bgcolor"]:
+                fmt.setBackground(QColor("#" + style["bgcolor"]))
+            if style["bold"]:
+                fmt.setFontWeight(QFont.Weight.Bold)
+            if style["italic"]:
+                fmt.setFontItalic(True)
+            self.formats[ttype] = fmt
+        return fmt
+
+    def _over(self) -> bool:
+        # отсчёт идёт от первой строки события; singleShot(0) сработает,
+        # когда Qt закончит текущий проход и вернётся в цикл событий
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+            QTimer.singleShot(0, self._reset)
+        return now - self.started > BUDGET
+
+    def _reset(self):
+        self.started = None
+
+    def highlightBlock(self, text):
+        block = self.currentBlock()
+        number = block.blockNumber()
+        cache = self.currentBlockUserData()
+
+        if self._over():
+            # прежняя подсветка и состояние -- каскад на этом остановится
+            if cache:
+                for start, length, fmt in cache.formats:
+                    self.setFormat(start, length, fmt)
+            self.setCurrentBlockState(self.currentBlockState())
+            self.frontier = min(self.frontier, number)
+            if not self.background.isActive():
+                self.background.start()
+            return
+
+        cache = self._parse(block, self.previousBlockState(), cache)
+        for start, length, fmt in cache.formats:
+            self.setFormat(start, length, fmt)
+        self.setCurrentBlockState(cache.state)
+        if number == self.frontier:
+            self.frontier += 1
+
+    def _parse(self, block, prev, cache) -> BlockCache:
+        key = (prev, block.text())
+        if cache is None or cache.key != key:
+            formats, state = self._lex(key[1], prev)
+            cache = BlockCache(key, formats, state)
+            block.setUserData(cache)
+        return cache
+
+    def _lex(self, text, prev):
+        if prev == PROSE:
+            opened = fence_open(text)
+            if not opened:
+                return [], PROSE
+            marker, lang = opened
+            return [(0, len(text), self.fence)], self._state((marker, lang, ("root",)))
+
+        marker, lang, stack = self.keys[prev]
+        if fence_close(text, marker):
+            return [(0, len(text), self.fence)], PROSE
+
+        tokens, stack = self.lexer.lex(lang, text, stack)
+        formats = [(0, len(text), self.code)]
+        formats += [(start, length, self._format(ttype)) for start, length, ttype in tokens]
+        return formats, self._state((marker, lang, stack))
+
+    def _changed(self, pos, removed, added):
+        # удалённые строки подтягивают недосчитанные снизу выше frontier
+        count = self.document().blockCount()
+        if count < self.blocks:
+            number = self.document().findBlock(pos).blockNumber()
+            if number < self.frontier:
+                self.frontier = max(number, self.frontier - (self.blocks - count))
+        self.blocks = count
+
+    def _continue(self):
+        """Фоновый проход: строки от frontier, пока есть время в кадре.
+
+        rehighlightBlock на каждую строку заставил бы QTextEdit
+        переразмечать документ после каждой, поэтому форматы ставятся
+        прямо в QTextLayout, а разметка сбрасывается один раз на порцию.
+        """
+        doc = self.document()
+        first = block = doc.findBlockByNumber(self.frontier)
+        start = time.perf_counter()
+        while block.isValid() and time.perf_counter() - start < BUDGET / 2:
+            cache = self._parse(block, block.previous().userState(), block.userData())
+            block.setUserState(cache.state)
+            ranges = []
+            for pos, length, fmt in cache.formats:
+                fr = QTextLayout.FormatRange()
+                fr.start, fr.length, fr.format = pos, length, fmt
+                ranges.append(fr)
+            block.layout().setFormats(ranges)
+            last, block = block, block.next()
+
+        if first.isValid():
+            doc.markContentsDirty(first.position(),
+                                  last.position() + last.length() - first.position())
+        if block.isValid():
+            self.frontier = block.blockNumber()
+        else:
+            self.frontier = doc.blockCount()
+            self.background.stop()
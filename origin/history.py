@@ -0,0 +1,55 @@
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import (
+    QDialog, QHBoxLayout, QListWidget, QListWidgetItem, QPushButton, QTextEdit, QVBoxLayout
+)
+
+
+class HistoryDialog(QDialog):
+    """Версии заметки; текст версии собирается только при выборе."""
+
+    restore = pyqtSignal(str, str)
+
+    def __init__(self, revisions, parent=None):
+        super().__init__(parent)
+        self.revisions = revisions
+        self.setWindowTitle("История заметки")
+        self.resize(800, 500)
+
+        layout = QHBoxLayout(self)
+        self.list = QListWidget()
+        self.list.currentItemChanged.connect(self.on_current)
+        layout.addWidget(self.list, 1)
+
+        right = QVBoxLayout()
+        layout.addLayout(right, 2)
+        self.text = QTextEdit()
+        self.text.setReadOnly(True)
+        right.addWidget(self.text)
+        self.btn_restore = QPushButton("Вернуть в редактор")
+        self.btn_restore.clicked.connect(self.on_restore)
+        right.addWidget(self.btn_restore)
+
+    def show_note(self, note_id):
+        self.list.clear()
+        self.text.clear()
+        for revision_id, seq, created, title, size in self.revisions.history(note_id):
+            item = QListWidgetItem(f"{seq}. {title} ({created}, {size} байт)")
+            item.setData(Qt.ItemDataRole.UserRole, (revision_id, title))
+            self.list.addItem(item)
+        if self.list.count():
+            self.list.setCurrentRow(0)
+        self.btn_restore.setEnabled(self.list.count() > 0)
+
+    def on_current(self, item, _previous=None):
+        if item is None:
+            return
+        revision_id, _ = item.data(Qt.ItemDataRole.UserRole)
+        self.text.setPlainText(self.revisions.text(revision_id))
+
+    def on_restore(self):
+        item = self.list.currentItem()
+        if item is None:
+            return
+        _, title = item.data(Qt.ItemDataRole.UserRole)
+        self.restore.emit(title or "", self.text.toPlainText())
+        self.accept()
@@ -0,0 +1,39 @@
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import QLabel, QListWidget, QListWidgetItem, QPushButton, QVBoxLayout, QWidget
+
+
+class BacklinksPanel(QWidget):
+    """Заметки, которые ссылаются на текущую через [[...]]."""
+
+    chosen = pyqtSignal(int)
+    graph_requested = pyqtSignal()
+
+    def __init__(self, links, parent=None):
+        super().__init__(parent)
+        self.links = links
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.label = QLabel("Ссылки на заметку:")
+        layout.addWidget(self.label)
+        self.list = QListWidget()
+        self.list.itemActivated.connect(self.on_activated)
+        layout.addWidget(self.list)
+        btn_graph = QPushButton("Граф связей")
+        btn_graph.clicked.connect(self.graph_requested)
+        layout.addWidget(btn_graph)
+
+    def show_for(self, note_id):
+        self.list.clear()
+        if not note_id:
+            self.label.setText("Ссылки на заметку:")
+            return
+        rows = self.links.backlinks(note_id)
+        self.label.setText(f"Ссылки на заметку: {len(rows)}")
+        for source, title, created in rows:
+            item = QListWidgetItem(f"{title} ({created[:10]})")
+            item.setData(Qt.ItemDataRole.UserRole, source)
+            self.list.addItem(item)
+
+    def on_activated(self, item):
+        self.chosen.emit(item.data(Qt.ItemDataRole.UserRole))
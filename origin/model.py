@@ -0,0 +1,118 @@
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from pkm.core.db import PAGE_SIZE, by_rank
+from pkm.core.events import NOTE_EVENTS
+
+
+class NoteListModel(QAbstractListModel):
+    """Список заметок, подгружаемый страницами по мере прокрутки.
+
+    Изменения заметок приходят с шины и правят только свою строку:
+    выделение и прокрутка вида при этом сохраняются.
+    """
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.rows = []
+        self.params = ("", "", True)
+        self.more = False
+        db.events.subscribe(self.on_event, *NOTE_EVENTS)
+
+    def reset(self, rows, params):
+        self.beginResetModel()
+        self.rows = list(rows)
+        self.params = params
+        self.more = len(rows) >= PAGE_SIZE
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        note_id, title, created, snippet, _ = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{title} ({created[:10]})"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return snippet
+        if role == Qt.ItemDataRole.UserRole:
+            return note_id
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.rows:
+            return
+
+        last = self.rows[-1]
+        rows = self.db.find_notes(*self.params, after=(last[4], last[0]))
+        self.more = len(rows) >= PAGE_SIZE
+        if not rows:
+            return
+
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def row_of(self, note_id):
+        for i, row in enumerate(self.rows):
+            if row[0] == note_id:
+                return i
+        return None
+
+    def on_event(self, event):
+        old = self.row_of(event.note_id)
+        row = None
+        if event.after:
+            # одна строка тем же запросом, что и у списка: фильтр, rank, сниппет
+            found = self.db.find_notes(*self.params, note_id=event.note_id)
+            row = found[0] if found else None
+
+        pos = self._position(row, old) if row else None
+        if pos is not None and pos == len(self.rows) - (old is not None) and self.more:
+            # место строки на ещё не загруженной странице
+            pos = None
+
+        if pos is None:
+            if old is not None:
+                self.beginRemoveRows(QModelIndex(), old, old)
+                del self.rows[old]
+                self.endRemoveRows()
+            return
+        if old is None:
+            self.beginInsertRows(QModelIndex(), pos, pos)
+            self.rows.insert(pos, row)
+            self.endInsertRows()
+            return
+        if pos != old:
+            # индекс назначения -- в нумерации до перемещения
+            self.beginMoveRows(QModelIndex(), old, old, QModelIndex(),
+                               pos + 1 if pos > old else pos)
+            del self.rows[old]
+            self.rows.insert(pos, row)
+            self.endMoveRows()
+            return
+        self.rows[old] = row
+        index = self.index(old, 0)
+        self.dataChanged.emit(index, index)
+
+    def _position(self, row, skip):
+        """Место строки в порядке списка, не считая строки номер skip."""
+        key = (row[4], row[0])
+        ascending = by_rank(self.params[0])
+        pos = 0
+        for i, other in enumerate(self.rows):
+            if i == skip:
+                continue
+            if ((other[4], other[0]) > key) if ascending else ((other[4], other[0]) < key):
+                return pos
+            pos += 1
+        return pos
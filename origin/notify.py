@@ -0,0 +1,33 @@
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLabel, QListWidget, QDialogButtonBox
+
+
+class ReminderPanel(QDialog):
+    """Немодальная сводка сработавших напоминаний."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Напоминания")
+        self.setModal(False)
+        self.setWindowFlag(Qt.WindowType.WindowStaysOnTopHint)
+        self.resize(420, 260)
+
+        layout = QVBoxLayout(self)
+        self.label = QLabel()
+        layout.addWidget(self.label)
+
+        self.items = QListWidget()
+        layout.addWidget(self.items)
+
+        btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok)
+        btns.accepted.connect(self.close_panel)
+        layout.addWidget(btns)
+
+    def add(self, rows):
+        for rem_id, note_id, remind_at, title in rows:
+            self.items.addItem(f"{remind_at} — {title}")
+        self.label.setText(f"Напоминаний: {self.items.count()}")
+
+    def close_panel(self):
+        self.items.clear()
+        self.hide()
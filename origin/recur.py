@@ -0,0 +1,45 @@
+from PyQt6.QtWidgets import QComboBox, QHBoxLayout, QLineEdit, QWidget
+
+from pkm.core.recur import PRESETS, rule_part
+
+CUSTOM = "Своё правило"
+
+
+class RuleEditor(QWidget):
+    """Повтор напоминания: готовые варианты или строка RRULE."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.preset = QComboBox()
+        for label, rule in PRESETS:
+            self.preset.addItem(label, rule)
+        self.preset.addItem(CUSTOM, None)
+        self.preset.currentIndexChanged.connect(self.on_preset)
+        layout.addWidget(self.preset)
+
+        self.custom = QLineEdit()
+        self.custom.setPlaceholderText("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO")
+        self.custom.setEnabled(False)
+        layout.addWidget(self.custom, 1)
+
+    def on_preset(self):
+        self.custom.setEnabled(self.preset.currentData() is None)
+
+    def rule(self) -> str:
+        """Правило без DTSTART; пустая строка -- без повтора."""
+        rule = self.preset.currentData()
+        return self.custom.text().strip() if rule is None else rule
+
+    def set_rule(self, text):
+        rule = rule_part(text)
+        index = self.preset.findData(rule)
+        if index < 0:
+            index = self.preset.count() - 1
+            self.custom.setText(rule)
+        else:
+            self.custom.clear()
+        self.preset.setCurrentIndex(index)
+        self.on_preset()
@@ -0,0 +1,76 @@
+import sqlite3
+
+from PyQt6.QtCore import QThread, Qt, pyqtSignal
+from PyQt6.QtWidgets import QLabel, QListWidget, QListWidgetItem, QVBoxLayout, QWidget
+
+from pkm.core.db import Database
+from pkm.core.duplicates import Duplicates
+from pkm.core.related import Related
+
+BACKFILL_BATCH = 500
+
+
+class Backfill(QThread):
+    """Строит векторы и подписи дубликатов заметкам, у которых их нет
+    (старая база, импорт).
+
+    Пишет через своё соединение короткими транзакциями, чтобы окно
+    не ждало блокировку дольше одной пачки.
+    """
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+
+    def run(self):
+        db = Database(self.db_path)
+        try:
+            related = Related(db)
+            while not self.isInterruptionRequested() and related.backfill(BACKFILL_BATCH):
+                pass
+            duplicates = Duplicates(db)
+            while not self.isInterruptionRequested() and duplicates.backfill(BACKFILL_BATCH):
+                pass
+        except sqlite3.OperationalError:
+            # база занята дольше busy_timeout: недостроенное доделает
+            # следующий запуск. Исключение из run() PyQt не прощает
+            pass
+        finally:
+            db.close()
+
+
+class RelatedPanel(QWidget):
+    """Похожие на текущую заметки; по двойному щелчку -- chosen(id)."""
+
+    chosen = pyqtSignal(int)
+
+    def __init__(self, db, related: Related, parent=None):
+        super().__init__(parent)
+        self.related = related
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel("Похожие заметки:"))
+        self.list = QListWidget()
+        self.list.itemActivated.connect(self.on_activated)
+        layout.addWidget(self.list)
+
+        self.backfill = Backfill(db.db_path, self)
+        self.backfill.start(QThread.Priority.LowPriority)
+
+    def show_for(self, note_id):
+        self.list.clear()
+        if not note_id:
+            return
+        for other, title, created, score in self.related.similar(note_id):
+            item = QListWidgetItem(f"{title} ({created[:10]})")
+            item.setToolTip(f"близость {score:.2f}")
+            item.setData(Qt.ItemDataRole.UserRole, other)
+            self.list.addItem(item)
+
+    def on_activated(self, item):
+        self.chosen.emit(item.data(Qt.ItemDataRole.UserRole))
+
+    def stop(self):
+        self.backfill.requestInterruption()
+        self.backfill.wait()
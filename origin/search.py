@@ -0,0 +1,92 @@
+import sqlite3
+import time
+from PyQt6.QtCore import QObject, QThread, QTimer, pyqtSignal, pyqtSlot
+
+from pkm.core.db import notes_query
+from pkm.core.instrument import explain
+
+DEBOUNCE_MS = 200
+
+
+class SearchWorker(QObject):
+    found = pyqtSignal(int, list)
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+        self.generation = 0
+        self.running = 0
+
+    @pyqtSlot(int, str, str, bool)
+    def run(self, generation, search, day, show_all):
+        if generation != self.generation:
+            return
+
+        self.running = generation
+        sql, params = notes_query(search, day, show_all)
+        with self.db.reader() as conn:
+            conn.set_progress_handler(self._cancelled, 1000)
+            start = time.perf_counter()
+            try:
+                rows = conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                # запрос прерван более новым
+                return
+            finally:
+                conn.set_progress_handler(None, 0)
+            if self.db.stats is not None:
+                self.db.stats.record(sql, params, (time.perf_counter() - start) * 1000,
+                                     len(rows), lambda: explain(conn, sql, params))
+
+        if generation == self.generation:
+            self.found.emit(generation, rows)
+
+    def _cancelled(self):
+        return self.running != self.generation
+
+
+class Search(QObject):
+    found = pyqtSignal(list, tuple)
+    requested = pyqtSignal(int, str, str, bool)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.params = ("", "", True)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DEBOUNCE_MS)
+        self.timer.timeout.connect(self._start)
+
+        self.worker_thread = QThread(self)
+        self.worker = SearchWorker(db)
+        self.worker.moveToThread(self.worker_thread)
+        self.requested.connect(self.worker.run)
+        self.worker.found.connect(self._deliver)
+        self.worker_thread.start()
+
+    def submit(self, search: str, day: str, show_all: bool, delay=True):
+        self.params = (search, day, show_all)
+        self.generation += 1
+        # воркер увидит новое поколение и бросит текущий запрос
+        self.worker.generation = self.generation
+        if delay:
+            self.timer.start()
+        else:
+            self.timer.stop()
+            self._start()
+
+    def stop(self):
+        self.timer.stop()
+        self.generation += 1
+        self.worker.generation = self.generation
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+
+    def _start(self):
+        self.requested.emit(self.generation, *self.params)
+
+    def _deliver(self, generation, rows):
+        if generation == self.generation:
+            self.found.emit(rows, self.params)
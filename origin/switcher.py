@@ -0,0 +1,114 @@
+from PyQt6.QtCore import QEvent, QThread, Qt, pyqtSignal
+from PyQt6.QtWidgets import QDialog, QLineEdit, QListWidget, QListWidgetItem, QVBoxLayout
+
+from pkm.core.events import NOTE_EVENTS, TAGS_CHANGED
+from pkm.core.trigram import TrigramIndex
+
+
+class IndexBuilder(QThread):
+    """Строит триграммный индекс заголовков и тегов один раз при запуске."""
+
+    built = pyqtSignal(object)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+
+    def run(self):
+        with self.db.reader() as conn:
+            notes = conn.execute("SELECT id, title FROM notes").fetchall()
+            tags = [r[0] for r in conn.execute("SELECT name FROM tags")]
+        self.built.emit(TrigramIndex.build(notes, tags))
+
+
+class QuickSwitcher(QDialog):
+    """Ctrl+P: переход к заметке или тегу по части названия, с опечатками.
+
+    На каждое нажатие -- только поиск в памяти, база не трогается.
+    """
+
+    chosen = pyqtSignal(object)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Быстрый переход")
+        self.resize(500, 400)
+        self.index = None
+        # изменения, пришедшие, пока индекс строится
+        self.pending = []
+
+        layout = QVBoxLayout(self)
+        self.query = QLineEdit()
+        self.query.setPlaceholderText("Заметка или тег…")
+        self.query.textChanged.connect(self.refresh)
+        self.query.installEventFilter(self)
+        layout.addWidget(self.query)
+
+        self.list = QListWidget()
+        self.list.itemActivated.connect(self.on_activated)
+        layout.addWidget(self.list)
+
+        db.events.subscribe(self.on_event, *NOTE_EVENTS, TAGS_CHANGED)
+
+        self.builder = IndexBuilder(db, self)
+        self.builder.built.connect(self.on_built)
+        self.builder.start(QThread.Priority.LowPriority)
+
+    def on_built(self, index):
+        self.index = index
+        events, self.pending = self.pending, []
+        for event in events:
+            self.on_event(event)
+        self.refresh()
+
+    def on_event(self, event):
+        if self.index is None:
+            self.pending.append(event)
+        elif event.kind == TAGS_CHANGED:
+            self.index.tags_changed(event.before, event.after)
+        else:
+            self.index.note_changed(event.before, event.after)
+
+    def popup(self):
+        self.query.clear()
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.query.setFocus()
+
+    def refresh(self):
+        self.list.clear()
+        if self.index is None:
+            self.list.addItem("Индекс строится…")
+            return
+        for key, label, _ in self.index.search(self.query.text()):
+            item = QListWidgetItem(f"#{label}" if key[0] == "tag" else label)
+            item.setData(Qt.ItemDataRole.UserRole, key)
+            self.list.addItem(item)
+        if self.list.count():
+            self.list.setCurrentRow(0)
+
+    def eventFilter(self, obj, event):
+        if obj is self.query and event.type() == QEvent.Type.KeyPress:
+            key = event.key()
+            if key in (Qt.Key.Key_Down, Qt.Key.Key_Up):
+                step = 1 if key == Qt.Key.Key_Down else -1
+                row = self.list.currentRow() + step
+                if 0 <= row < self.list.count():
+                    self.list.setCurrentRow(row)
+                return True
+            if key in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+                if self.list.currentItem():
+                    self.on_activated(self.list.currentItem())
+                return True
+        return super().eventFilter(obj, event)
+
+    def on_activated(self, item):
+        key = item.data(Qt.ItemDataRole.UserRole)
+        if key is None:
+            return
+        self.hide()
+        self.chosen.emit(key)
+
+    def stop(self):
+        self.builder.wait()
@@ -1,18 +1,40 @@
-from PyQt6.QtGui import QIcon
+import sqlite3
+from datetime import datetime
+
+from PyQt6.QtGui import QIcon, QKeySequence, QShortcut, QTextCursor
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
-    QLineEdit, QListWidget, QTextEdit, QPushButton, QLabel,
-    QMessageBox, QCalendarWidget, QDateTimeEdit, QCheckBox, QListWidgetItem
+    QLineEdit, QListView, QTextEdit, QPushButton, QLabel,
+    QMessageBox, QCalendarWidget, QDateTimeEdit, QCheckBox, QTabWidget
 )
-from PyQt6.QtCore import QDateTime, Qt, QEvent
-from datetime import datetime
+from PyQt6.QtCore import QDateTime, Qt, QEvent, QThread
+from origin.backup import Backup
+from origin.compress import Compress
+from origin.heatmap import CalendarHeatmap
+from origin.highlight import CodeHighlighter
+from origin.history import HistoryDialog
+from origin.links import BacklinksPanel
+from origin.model import NoteListModel
+from origin.recur import RuleEditor
+from origin.related import RelatedPanel
+from origin.search import Search
+from origin.switcher import QuickSwitcher
+from pkm.core.events import NOTE_DELETED
+from pkm.core.notes import NoteService
+from pkm.core.recur import keep_rule, make_rule, next_after
+from reminders import Reminder
 
 
 class MainWindow(QMainWindow):
     def __init__(self, db):
         super().__init__()
         self.db = db
+        self.notes_service = NoteService(db)
         self.current = None
+        # куски большой заметки, ещё не подгруженные в редактор
+        self.pending = []
+        self.searcher = Search(db, self)
+        self.searcher.found.connect(self.fill)
 
         self.setWindowTitle("Personal Knowledge Manager")
         self.setWindowIcon(QIcon("img/ico.png"))
@@ -22,10 +44,72 @@ class MainWindow(QMainWindow):
 
         self.title.installEventFilter(self)
 
+        self.diagnostics = None
+        self.graph = None
+        self.history = None
+        self.switcher = QuickSwitcher(db, self)
+        self.switcher.chosen.connect(self.on_switch)
+        QShortcut(QKeySequence("Ctrl+P"), self, self.switcher.popup)
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.on_diagnostics)
+
+        self.reminder = Reminder(db, self)
+        self.compress = Compress(db.db_path, self)
+        self.compress.start(QThread.Priority.LowPriority)
+        self.backup = Backup(db.db_path, self)
+        self.backup.done.connect(lambda path: self.statusBar().showMessage(f"Резервная копия: {path}", 10_000))
+        self.backup.failed.connect(lambda error: self.statusBar().showMessage(f"Резервная копия не снята: {error}"))
+        db.events.subscribe(self.on_event, NOTE_DELETED)
         self.load()
-        self.check_rems()
 
 
+    def on_diagnostics(self):
+        if self.diagnostics is None:
+            # pyqtgraph тяжёлый, грузим только по запросу
+            from origin.diagnostics import Diagnostics
+            self.diagnostics = Diagnostics(self.db, self)
+        self.diagnostics.show()
+        self.diagnostics.raise_()
+
+    def on_graph(self):
+        if not self.current:
+            return
+        if self.graph is None:
+            # pyqtgraph тяжёлый, грузим только по запросу
+            from origin.graph import GraphView
+            self.graph = GraphView(self.notes_service.links, self)
+            self.graph.chosen.connect(self.on_related)
+        self.graph.show_note(self.current, self.title.text())
+        self.graph.show()
+        self.graph.raise_()
+
+    def on_history(self):
+        if not self.current:
+            QMessageBox.information(self,
+                                    "История",
+                                    "Ничего не выбрано."
+                                    )
+            return
+        if self.history is None:
+            self.history = HistoryDialog(self.notes_service.revisions, self)
+            self.history.restore.connect(self.on_restore)
+        self.history.show_note(self.current)
+        self.history.show()
+        self.history.raise_()
+
+    def on_restore(self, title, text):
+        """Версия попадает в редактор; в базу -- только по «Сохранить»."""
+        self.title.setText(title)
+        self.pending = []
+        self.text_i.setPlainText(text)
+
+    def closeEvent(self, event):
+        self.searcher.stop()
+        self.related.stop()
+        self.compress.stop()
+        self.backup.stop()
+        self.switcher.stop()
+        super().closeEvent(event)
+
     def eventFilter(self, obj, event):
         if obj is self.title:
             if event.type() == QEvent.Type.KeyPress:
@@ -44,11 +128,16 @@ class MainWindow(QMainWindow):
 
         self.search = QLineEdit()
         self.search.setPlaceholderText("Поиск: текст или #тег")
-        self.search.textChanged.connect(self.load)
+        self.search.textChanged.connect(self.on_search)
         left.addWidget(self.search)
 
-        self.notes = QListWidget()
-        self.notes.itemSelectionChanged.connect(self.on_note_selected)
+        self.model = NoteListModel(self.db, self)
+        # до setModel: слот должен успеть раньше модели выделения
+        self.model.rowsAboutToBeRemoved.connect(self.on_rows_removing)
+        self.notes = QListView()
+        self.notes.setUniformItemSizes(True)
+        self.notes.setModel(self.model)
+        self.notes.selectionModel().selectionChanged.connect(self.on_note_selected)
         left.addWidget(self.notes)
 
         btns = QHBoxLayout()
@@ -62,6 +151,16 @@ class MainWindow(QMainWindow):
         btns.addWidget(btn_new)
         btns.addWidget(btn_del)
 
+        side = QTabWidget()
+        self.related = RelatedPanel(self.db, self.notes_service.related)
+        self.related.chosen.connect(self.on_related)
+        side.addTab(self.related, "Похожие")
+        self.backlinks = BacklinksPanel(self.notes_service.links)
+        self.backlinks.chosen.connect(self.on_related)
+        self.backlinks.graph_requested.connect(self.on_graph)
+        side.addTab(self.backlinks, "Ссылки")
+        left.addWidget(side)
+
         right = QVBoxLayout()
         layout.addLayout(right, 70)
 
@@ -71,6 +170,11 @@ class MainWindow(QMainWindow):
 
         right.addWidget(QLabel("Текст заметки:"))
         self.text_i = QTextEdit()
+        bar = self.text_i.verticalScrollBar()
+        bar.valueChanged.connect(self.on_text_scroll)
+        # короткий кусок не даёт прокрутки -- дочитываем и по смене диапазона
+        bar.rangeChanged.connect(lambda *_: self.on_text_scroll(bar.value()))
+        self.highlighter = CodeHighlighter(self.text_i.document())
         right.addWidget(self.text_i, 1)
 
         right.addWidget(QLabel("Теги:"))
@@ -86,11 +190,18 @@ class MainWindow(QMainWindow):
         right.addWidget(self.checkbox)
         right.addWidget(QLabel("Напоминание:"))
         right.addWidget(self.rem_date)
+        right.addWidget(QLabel("Повтор:"))
+        self.repeat = RuleEditor()
+        right.addWidget(self.repeat)
 
         self.save = QPushButton("Сохранить")
         self.save.clicked.connect(self.on_save)
         right.addWidget(self.save)
 
+        btn_history = QPushButton("История")
+        btn_history.clicked.connect(self.on_history)
+        right.addWidget(btn_history)
+
         self.show_all = QCheckBox("Все заметки")
         self.show_all.stateChanged.connect(self.load)
         right.addWidget(self.show_all)
@@ -99,91 +210,129 @@ class MainWindow(QMainWindow):
         self.calendar = QCalendarWidget()
         self.calendar.selectionChanged.connect(self.load)
         right.addWidget(self.calendar)
+        self.heatmap = CalendarHeatmap(self.db, self.calendar)
+
+    def on_search(self):
+        self.searcher.submit(self.search.text(),
+                             self.calendar.selectedDate().toString("yyyy-MM-dd"),
+                             self.show_all.isChecked())
 
     def load(self):
-        self.notes.clear()
-        search = self.search.text().strip()
-        param = self.calendar.selectedDate().toString("yyyy-MM-dd")
-        show_all = self.show_all.isChecked()
-
-        if show_all:
-            sql = ("SELECT id, title, created FROM notes "
-                   "WHERE 1=1")
-            params = []
-        else:
-            sql = ("SELECT id, title, created FROM notes "
-                   "WHERE DATE(created)=DATE(?)")
-            params = [param]
-
-        if search:
-            if search.startswith("#"):
-                tag = search[1:].strip()
-                if show_all:
-                    sql = """
-                    SELECT DISTINCT n.id, n.title, n.created FROM notes n
-                    LEFT JOIN note_tags nt ON n.id = nt.note_id
-                    LEFT JOIN tags t ON nt.tag_id = t.id
-                    WHERE t.name LIKE ?
-                    ORDER BY n.created DESC
-                    """
-                    params = [f"%{tag}%"]
-                else:
-                    sql = """
-                    SELECT DISTINCT n.id, n.title, n.created FROM notes n
-                    LEFT JOIN note_tags nt ON n.id = nt.note_id
-                    LEFT JOIN tags t ON nt.tag_id = t.id
-                    WHERE t.name LIKE ? AND DATE(n.created)=DATE(?)
-                    ORDER BY n.created DESC
-                    """
-                    params = [f"%{tag}%", param]
-            else:
-                sql += " AND (title LIKE ?)"
-                params.append(f"%{search}%")
-
-        cur = self.db.execute(sql, tuple(params))
-        rows = cur.fetchall()
-
-        if not rows:
+        self.searcher.submit(self.search.text(),
+                             self.calendar.selectedDate().toString("yyyy-MM-dd"),
+                             self.show_all.isChecked(),
+                             delay=False)
+
+    def fill(self, rows, params):
+        self.model.reset(rows, params)
+        # открытая заметка остаётся в редакторе, а если она есть
+        # в новом списке -- и выделенной
+        index = self.select(self.current)
+        if index:
+            self.notes.scrollTo(index)
+
+    def select(self, note_id):
+        row = self.model.row_of(note_id) if note_id else None
+        if row is None:
+            return None
+        index = self.model.index(row, 0)
+        self.notes.setCurrentIndex(index)
+        return index
+
+    def on_note_selected(self):
+        indexes = self.notes.selectionModel().selectedIndexes()
+        if not indexes:
+            self.current = None
             self.clear()
             return
 
-        for row in rows:
-            note_id, title, created = row
-            item = QListWidgetItem(f"{title} ({created[:10]})")
-            item.setData(Qt.ItemDataRole.UserRole, note_id)
-            self.notes.addItem(item)
+        note_id = indexes[0].data(Qt.ItemDataRole.UserRole)
+        if note_id != self.current:
+            self.open_note(note_id)
 
-    def on_note_selected(self):
-        item = self.notes.currentItem()
-        if not item:
+    def on_event(self, event):
+        if event.note_id == self.current:
             self.current = None
             self.clear()
+
+    def on_rows_removing(self, parent, first, last):
+        """Строка открытой заметки уходит из списка (удалена или больше не
+        подходит под фильтр). Иначе Qt сделал бы текущей соседнюю строку
+        и открыл её заметку; редактор при удалении чистит on_event."""
+        row = self.model.row_of(self.current) if self.current else None
+        if row is None or not first <= row <= last:
             return
+        selection = self.notes.selectionModel()
+        selection.blockSignals(True)
+        selection.clear()
+        selection.blockSignals(False)
+
+    def on_related(self, note_id):
+        # похожей заметки может не быть в списке (другая дата, поиск)
+        self.notes.clearSelection()
+        self.open_note(note_id)
 
-        note_id = item.data(Qt.ItemDataRole.UserRole)
-        row = self.db.get_note(note_id)
-        if not row:
+    def on_switch(self, key):
+        kind, value = key
+        if kind == "tag":
+            self.search.setText(f"#{value}")
+        else:
+            self.on_related(value)
+
+    def open_note(self, note_id):
+        note = self.db.load_note(note_id)
+        if not note:
             self.current = None
             self.clear()
             return
 
-        self.current = row[0]
-        self.title.setText(row[1] or "")
-        self.text_i.setPlainText(row[2] or "")
-
-        tags = self.db.get_tags(self.current)
-        self.tags.setText(", ".join(tags))
+        self.current = note.id
+        self.related.show_for(note.id)
+        self.backlinks.show_for(note.id)
+        self.title.setText(note.title or "")
+        self.show_text(note)
+        self.tags.setText(", ".join(note.tags))
 
-        rems = self.db.get_rem(self.current)
-        if rems:
-            rem = rems[0]
-            dt_str = rem[1]
-            dt = QDateTime.fromString(dt_str, "yyyy-MM-dd HH:mm:ss")
-            self.rem_date.setDateTime(dt)
+        if note.remind_at:
+            self.rem_date.setDateTime(note.remind_at)
             self.checkbox.setChecked(True)
+            self.repeat.set_rule(note.rems[0][3])
         else:
             self.checkbox.setChecked(False)
             self.rem_date.setDateTime(QDateTime.currentDateTime())
+            self.repeat.set_rule(None)
+
+    def show_text(self, note):
+        """Большую заметку показываем с первого куска, остальные
+        дочитываются из базы по мере прокрутки."""
+        if not note.chunks:
+            self.pending = []
+            self.text_i.setPlainText(note.content or "")
+            return
+        first, *self.pending = note.chunks
+        self.text_i.setPlainText(self.db.read_chunk(first))
+
+    def on_text_scroll(self, value):
+        bar = self.text_i.verticalScrollBar()
+        if not self.pending or value < bar.maximum() - 2 * bar.pageStep():
+            return
+        cursor = QTextCursor(self.text_i.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(self.db.read_chunk(self.pending.pop(0)))
+
+    def editor_text(self) -> str:
+        """Полный текст редактора вместе с неподгруженным хвостом.
+
+        Хвост дописывается в сам редактор: сохранение заменит куски
+        заметки, и номера в pending указывали бы на чужие или удалённые.
+        """
+        if self.pending:
+            rest = "".join(self.db.read_chunk(i) for i in self.pending)
+            self.pending = []
+            cursor = QTextCursor(self.text_i.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText(rest)
+        return self.text_i.toPlainText().strip()
 
     def on_new(self):
         self.current = None
@@ -192,10 +341,14 @@ class MainWindow(QMainWindow):
 
     def clear(self):
         self.title.clear()
+        self.related.show_for(None)
+        self.backlinks.show_for(None)
+        self.pending = []
         self.text_i.clear()
         self.tags.clear()
         self.checkbox.setChecked(False)
         self.rem_date.setDateTime(QDateTime.currentDateTime())
+        self.repeat.set_rule(None)
 
     def on_delete(self):
         if not self.current:
@@ -212,35 +365,39 @@ class MainWindow(QMainWindow):
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         if reply == QMessageBox.StandardButton.Yes:
-            self.db.execute("DELETE FROM notes "
-                            "WHERE id = ?",
-                            (self.current,)
-                            )
-            self.db.execute("DELETE FROM note_tags "
-                            "WHERE note_id = ?",
-                            (self.current,)
-                            )
-            self.db.execute("DELETE FROM reminders "
-                            "WHERE note_id = ?",
-                            (self.current,)
-                            )
-            self.current = None
-            self.clear()
-            self.load()
-
-    def check(self, title, date_str):
-        return self.db.execute(
-            "SELECT id, title FROM notes "
-            "WHERE title = ? AND DATE(created) = DATE(?) LIMIT 1",
-            (title, date_str)
-        ).fetchone()
+            # строку списка и редактор убирает событие удаления
+            try:
+                self.notes_service.delete(self.current)
+            except sqlite3.OperationalError as e:
+                self.write_failed(e)
 
     def on_save(self):
         title = self.title.text().strip()
-        content = self.text_i.toPlainText().strip()
+        content = self.editor_text()
         tags = [i.strip() for i in self.tags.text().split(",") if i.strip()]
         rem_e = self.checkbox.isChecked()
         rem_dt = self.rem_date.dateTime().toString("yyyy-MM-dd HH:mm:ss") if rem_e else None
+        rrule = None
+        note = self.db.load_note(self.current) if self.current and rem_e else None
+        stored = note.rems[0] if note and note.rems else (None, None, None, None)
+        if rem_e and keep_rule(stored[3], stored[1], self.repeat.rule(), rem_dt):
+            rrule = stored[3]
+        elif rem_e:
+            try:
+                rrule = make_rule(self.rem_date.dateTime().toPyDateTime(), self.repeat.rule())
+            except ValueError:
+                QMessageBox.warning(self,
+                                    "Ошибка",
+                                    "Не удалось разобрать правило повтора."
+                                    )
+                return
+            if rrule and not next_after(rrule, datetime.now(), inc=True):
+                QMessageBox.warning(self,
+                                    "Ошибка",
+                                    "По этому правилу напоминание больше не сработает: "
+                                    "все повторения уже в прошлом."
+                                    )
+                return
         sel_date = self.calendar.selectedDate().toString("yyyy-MM-dd")
 
         if not title:
@@ -251,36 +408,21 @@ class MainWindow(QMainWindow):
             return
 
         if self.current:
-            self.db.execute("UPDATE notes "
-                            "SET title = ?, content = ? "
-                            "WHERE id = ?",
-                            (title, content, self.current)
-                            )
-            self.db.set_tags(self.current, tags)
-
-            exist_rem = self.db.get_rem(self.current)
-            if rem_e:
-                if exist_rem:
-                    self.db.execute("UPDATE reminders "
-                                    "SET remind_at = ?, mail_sent = 0 "
-                                    "WHERE id = ?",
-                                    (rem_dt, exist_rem[0][0])
-                                    )
-                else:
-                    self.db.add_reminder(self.current, rem_dt)
-            else:
-                for r in exist_rem:
-                    self.db.del_rem(r[0])
+            try:
+                self.notes_service.save(self.current, title, content, tags, rem_dt, rrule=rrule)
+            except sqlite3.OperationalError as e:
+                self.write_failed(e)
+                return
+            self.saved(self.current)
 
             QMessageBox.information(self,
                                     "Сохранено",
                                     "Заметка обновлена."
                                     )
-            self.load()
             return
 
-        check_tit = self.check(title, sel_date)
-        if check_tit:
+        duplicate = self.notes_service.find_duplicate(title, sel_date)
+        if duplicate:
             reply = QMessageBox.question(self,
                 "Заметка существует",
                 "Заметка с таким названием на эту дату уже есть. Заменить?",
@@ -288,48 +430,44 @@ class MainWindow(QMainWindow):
             )
             if reply == QMessageBox.StandardButton.No:
                 return
-
-            self.db.execute("DELETE FROM notes "
-                            "WHERE id = ?",
-                            (check_tit[0],))
-            self.db.execute("DELETE FROM note_tags "
-                            "WHERE note_id = ?",
-                            (check_tit[0],))
-            self.db.execute("DELETE FROM reminders "
-                            "WHERE note_id = ?",
-                            (check_tit[0],))
-
-        self.db.execute(
-            "INSERT INTO notes(title, content, created) "
-            "VALUES(?, ?, datetime('now'))",
-            (title, content)
-        )
-
-        cur = self.db.execute(
-            "SELECT id FROM notes "
-            "WHERE title = ? "
-            "ORDER BY created DESC LIMIT 1",
-            (title,)
-        )
-        note_id = cur.fetchone()[0]
-
-        self.db.set_tags(note_id, tags)
-        if rem_e and rem_dt:
-            self.db.add_rem(note_id, rem_dt)
+        else:
+            similar = self.notes_service.duplicates.find(content, limit=1)
+            if similar:
+                _, other, created, score = similar[0]
+                reply = QMessageBox.question(self,
+                    "Похожая заметка",
+                    f"Такой текст уже есть в заметке «{other}» ({created[:10]}), "
+                    f"совпадение {score:.0%}. Всё равно сохранить?",
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+                )
+                if reply == QMessageBox.StandardButton.No:
+                    return
+
+        try:
+            note_id, _ = self.notes_service.save(None, title, content, tags, rem_dt,
+                                                 replace=duplicate, rrule=rrule)
+        except sqlite3.OperationalError as e:
+            self.write_failed(e)
+            return
+        self.saved(note_id)
 
         QMessageBox.information(self,
                                 "Сохранено",
                                 "Заметка создана."
                                 )
-        self.load()
 
-    def check_rems(self):
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        rems = self.db.get_rem(now)
-        for rem_id, note_id, remind_at, title in rems:
-            msg = QMessageBox()
-            msg.setWindowTitle("Напоминание")
-            msg.setText(f"Напоминание для заметки:\n{title}\nВремя: {remind_at}")
-            msg.setIcon(QMessageBox.Icon.Information)
-            msg.exec()
-            self.db.mark_reminder_sent(rem_id)
+    def write_failed(self, error):
+        # база занята дольше busy_timeout или диск недоступен: текст
+        # остаётся в редакторе, сохранить можно ещё раз
+        QMessageBox.warning(self,
+                            "Ошибка",
+                            f"Не удалось записать в базу: {error}"
+                            )
+
+    def saved(self, note_id):
+        """Строку списка уже поправило событие; здесь -- только то,
+        что показывает сама открытая заметка."""
+        self.current = note_id
+        self.select(note_id)
+        self.related.show_for(note_id)
+        self.backlinks.show_for(note_id)
@@ -0,0 +1,4 @@
+"""Слой данных и сервисов PKM без зависимости от Qt."""
+from pkm.core.db import Database, Note
+from pkm.core.notes import NoteService
+from pkm.core.schedule import ReminderQueue
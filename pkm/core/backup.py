@@ -0,0 +1,151 @@
+# pkm/core/backup.py
+"""Резервные копии базы.
+
+Копия снимается Connection.backup порциями по PAGES страниц через
+отдельное соединение. Оно держит открытую читающую транзакцию, поэтому
+в WAL-режиме копия -- согласованный снимок, а запись приложения её не
+перезапускает. Снимок проверяется integrity_check, сжимается gzip и
+ложится рядом с прежними. Хранятся последние KEEP снимков.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from pkm.core.db import DATA_DIR
+
+BACKUP_DIR = os.path.join(DATA_DIR, "backups")
+KEEP = 7
+# 1024 страницы по 4К -- 4 МБ за шаг
+PAGES = 1024
+# пауза между шагами, чтобы копия не забирала весь диск у приложения
+PAUSE = 0.002
+PREFIX = "pkm-"
+SUFFIX = ".sqlite3.gz"
+
+
+class BackupError(Exception):
+    pass
+
+
+def snapshots(folder: str = BACKUP_DIR) -> List[Path]:
+    """Снимки от старых к новым."""
+    return sorted(p for p in Path(folder).glob(f"{PREFIX}*{SUFFIX}") if p.is_file())
+
+
+def check(path, cancelled: Optional[Callable[[], bool]] = None) -> None:
+    conn = sqlite3.connect(path)
+    if cancelled:
+        # проверка большой базы идёт секунды; обработчик даёт её прервать
+        conn.set_progress_handler(cancelled, 10000)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchall()
+    except sqlite3.OperationalError as e:
+        if cancelled and cancelled():
+            raise BackupError("копирование прервано") from e
+        raise
+    finally:
+        conn.close()
+    if result != [("ok",)]:
+        raise BackupError("; ".join(r[0] for r in result[:5]))
+
+
+def snapshot(db_path: str, folder: str = BACKUP_DIR, keep: int = KEEP,
+             progress: Optional[Callable[[int, int], None]] = None,
+             cancelled: Optional[Callable[[], bool]] = None) -> Path:
+    """Снимает, проверяет и сжимает копию; возвращает путь к снимку.
+
+    progress(осталось, всего) -- после каждого шага в страницах;
+    cancelled() -> True прерывает копирование.
+    """
+    if keep < 0:
+        raise ValueError("keep must not be negative")
+    Path(folder).mkdir(parents=True, exist_ok=True)
+    # с микросекундами: два снимка за одну секунду (копия вручную рядом
+    # с плановой) не затирают друг друга и при ротации считаются оба
+    name = f"{PREFIX}{datetime.now():%Y%m%d-%H%M%S-%f}"
+    raw = Path(folder) / f"{name}.sqlite3.part"
+    target = Path(folder) / f"{name}{SUFFIX}"
+
+    def stop():
+        if cancelled and cancelled():
+            raise BackupError("копирование прервано")
+
+    def step(status, remaining, total):
+        stop()
+        if progress:
+            progress(remaining, total)
+        time.sleep(PAUSE)
+
+    source = sqlite3.connect(db_path)
+    dest = sqlite3.connect(raw)
+    try:
+        # снимок на момент начала: читающая транзакция до конца копирования
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        source.backup(dest, pages=PAGES, progress=step)
+        source.rollback()
+        dest.close()
+        check(raw, cancelled)
+        with open(raw, "rb") as src, gzip.open(f"{target}.part", "wb", compresslevel=6) as gz:
+            while True:
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                stop()
+                gz.write(chunk)
+        os.replace(f"{target}.part", target)
+    except BaseException:
+        Path(f"{target}.part").unlink(missing_ok=True)
+        raise
+    finally:
+        source.close()
+        dest.close()
+        raw.unlink(missing_ok=True)
+
+    rotate(folder, keep)
+    return target
+
+
+def rotate(folder: str = BACKUP_DIR, keep: int = KEEP):
+    """Удаляет старые снимки, оставляя keep последних (хотя бы один)."""
+    if keep < 0:
+        raise ValueError("keep must not be negative")
+    files = snapshots(folder)
+    # пока снимков меньше keep, срез пуст: отрицательная граница
+    # удалила бы все, кроме последнего
+    for old in files[:max(len(files) - max(keep, 1), 0)]:
+        old.unlink(missing_ok=True)
+
+
+def restore(path, db_path: str) -> Optional[Path]:
+    """Заменяет базу снимком. Приложение должно быть закрыто.
+
+    Текущая база не удаляется, а откладывается рядом; возвращает её путь.
+    """
+    db_path = Path(db_path)
+    part = db_path.with_name(db_path.name + ".restore")
+    try:
+        with gzip.open(path, "rb") as gz, open(part, "wb") as out:
+            shutil.copyfileobj(gz, out, 1024 * 1024)
+        check(part)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+    aside = None
+    if db_path.exists():
+        aside = db_path.with_name(f"{db_path.name}.before-restore-{datetime.now():%Y%m%d-%H%M%S-%f}")
+        # WAL дописывается в файл, чтобы отложенная копия была целой
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+        os.replace(db_path, aside)
+    for extra in ("-wal", "-shm"):
+        Path(f"{db_path}{extra}").unlink(missing_ok=True)
+    os.replace(part, db_path)
+    return aside
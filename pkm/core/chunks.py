@@ -0,0 +1,68 @@
+# pkm/core/chunks.py
+"""Нарезка больших заметок на куски для note_chunks.
+
+Границы ставятся по концам строк и зависят только от содержимого:
+строка становится границей, если её хэш меньше порога, растущего с
+длиной строки, -- в среднем одна граница на CHUNK_AVG байт текста.
+Границы редкие, а минимальный размер куска мал, поэтому после правки
+нарезка возвращается к прежним границам уже на следующей из них, и
+перезаписываются один-два куска, а не все последующие. Каждый кусок --
+целые строки или, для очень длинной строки, отрезок по границе
+символа UTF-8: любой кусок декодируется сам по себе.
+"""
+import array
+import hashlib
+import zlib
+from typing import List
+
+# заметки крупнее порога хранятся кусками
+THRESHOLD = 256 * 1024
+CHUNK_MIN = 8 * 1024
+CHUNK_AVG = 48 * 1024
+CHUNK_MAX = 128 * 1024
+# вероятность границы на байт строки -- 1 / CHUNK_AVG
+BOUNDARY = 2 ** 32 // CHUNK_AVG
+
+
+def split(data: bytes) -> List[bytes]:
+    chunks = []
+    start = pos = 0
+    size = len(data)
+    view = memoryview(data)
+    while pos < size:
+        end = data.find(b"\n", pos)
+        end = size if end < 0 else end + 1
+
+        if end - start > CHUNK_MAX:
+            # по концу предыдущей строки, а если строка одна -- по символу
+            cut = pos if pos > start else start + CHUNK_MAX
+            while data[cut] & 0xC0 == 0x80:
+                cut -= 1
+            chunks.append(data[start:cut])
+            start = pos = cut
+            continue
+
+        if end - start >= CHUNK_MIN and zlib.crc32(view[pos:end]) < (end - pos) * BOUNDARY:
+            chunks.append(data[start:end])
+            start = end
+        pos = end
+
+    if start < size:
+        chunks.append(data[start:])
+    return chunks
+
+
+def digest(chunk: bytes) -> bytes:
+    return hashlib.blake2b(chunk, digest_size=16).digest()
+
+
+def pack(ids) -> bytes:
+    return array.array("q", ids).tobytes()
+
+
+def unpack(blob) -> tuple:
+    if not blob:
+        return ()
+    ids = array.array("q")
+    ids.frombytes(blob)
+    return tuple(ids)
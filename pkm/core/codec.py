@@ -0,0 +1,145 @@
+# pkm/core/codec.py
+"""Сжатие текстов заметок.
+
+notes.codec говорит, что лежит в notes.content: 0 -- текст как есть,
+1 -- zlib, от 2 и выше -- zlib с общим словарём codecs.id. Словарь
+обучается на самих заметках и выручает короткие тексты, которым
+своих повторов для zlib не хватает. Индекс FTS всегда получает
+исходный текст: при сжатом content его пишет Database.save_note.
+"""
+import zlib
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+PLAIN = 0
+ZLIB = 1
+
+# короче -- не сжимаем, заголовок zlib съест выгоду
+MIN_SIZE = 128
+# словарь сжимает тексты до 16К, длиннее -- обычный zlib: окно в 32К
+# у длинного текста быстро заполняется им самим, и выгоды от словаря нет
+DICT_LIMIT = 16 * 1024
+DICT_SIZE = 32 * 1024
+LEVEL = 6
+# сжатое храним, только если оно заметно меньше
+GAIN = 0.9
+
+# обучение: сколько заметок нужно и сколько берётся в выборку
+TRAIN_MIN = 200
+TRAIN_SAMPLE = 2000
+BACKFILL_KEY = "compress:last_id"
+
+
+def compress(data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+    if not dictionary:
+        return zlib.compress(data, LEVEL)
+    packer = zlib.compressobj(LEVEL, zdict=dictionary)
+    return packer.compress(data) + packer.flush()
+
+
+def decompress(blob: bytes, dictionary: Optional[bytes] = None) -> bytes:
+    if not dictionary:
+        return zlib.decompress(blob)
+    unpacker = zlib.decompressobj(zdict=dictionary)
+    return unpacker.decompress(blob) + unpacker.flush()
+
+
+def encode(text: str, dict_id: Optional[int], dictionary: Optional[bytes]) -> Tuple[int, object]:
+    """(codec, значение для notes.content)."""
+    data = text.encode("utf-8")
+    if len(data) < MIN_SIZE:
+        return PLAIN, text
+    if not dictionary or len(data) > DICT_LIMIT:
+        dict_id, dictionary = ZLIB, None
+    blob = compress(data, dictionary)
+    if len(blob) > len(data) * GAIN:
+        return PLAIN, text
+    return dict_id, blob
+
+
+def train(samples: Iterable[str], size: int = DICT_SIZE) -> bytes:
+    """Словарь из строк и слов, что встречаются во многих заметках.
+
+    Самое частое кладётся в конец: до конца словаря zlib дотягивается
+    из любого места окна.
+    """
+    lines, words = Counter(), Counter()
+    for text in samples:
+        lines.update({line for line in text.splitlines() if len(line.strip()) >= 8})
+        words.update(set(text.split()))
+
+    pieces, total = [], 0
+    common = [line + "\n" for line, n in lines.most_common() if n > 1]
+    common += [word + " " for word, n in words.most_common() if n > 1 and len(word) > 3]
+    for piece in common:
+        raw = piece.encode("utf-8")
+        if total + len(raw) > size:
+            break
+        pieces.append(raw)
+        total += len(raw)
+    return b"".join(reversed(pieces))
+
+
+class Compressor:
+    """Фоновое сжатие заметок, записанных до появления кодеков или
+    пришедших импортом: проход по id с запомненной позицией."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def train(self) -> Optional[int]:
+        """Обучает словарь, если его ещё нет и заметок хватает."""
+        if self.db.execute("SELECT 1 FROM codecs LIMIT 1").fetchone():
+            return None
+        # берём и уже сжатые: save_note сжимает новые заметки zlib без
+        # словаря, и в свежей базе несжатых для обучения не набирается
+        rows = self.db.execute("SELECT content, codec FROM notes "
+                               "WHERE content IS NOT NULL ORDER BY random() LIMIT ?",
+                               (TRAIN_SAMPLE,)
+                               ).fetchall()
+        samples = [text for text in (self.db.decode_text(content, kind) for content, kind in rows)
+                   if MIN_SIZE <= len(text.encode("utf-8")) <= DICT_LIMIT]
+        if len(samples) < TRAIN_MIN:
+            return None
+        dictionary = train(samples)
+        if not dictionary:
+            return None
+        with self.db.transaction():
+            codec_id = self.db.execute("INSERT INTO codecs(id, dictionary) "
+                                       "VALUES(max(2, (SELECT coalesce(max(id), 0) + 1 FROM codecs)), ?)",
+                                       (dictionary,)
+                                       ).lastrowid
+            # со словарём проход начинается заново: сжатые без него пересжимаются
+            self.db.execute("DELETE FROM app_settings WHERE key = ?", (BACKFILL_KEY,))
+        return codec_id
+
+    def backfill(self, limit: int = 500) -> int:
+        """Сжимает следующую пачку. Возвращает, сколько заметок просмотрено.
+
+        Сжатые zlib без словаря тоже пересматриваются: после обучения
+        словарь обычно даёт им меньший размер.
+        """
+        row = self.db.execute("SELECT value FROM app_settings WHERE key = ?",
+                              (BACKFILL_KEY,)
+                              ).fetchone()
+        last = int(row[0]) if row else 0
+        rows = self.db.execute("SELECT id, content, codec FROM notes "
+                               "WHERE id > ? AND codec IN (?, ?) AND content IS NOT NULL "
+                               "ORDER BY id LIMIT ?",
+                               (last, PLAIN, ZLIB, limit)
+                               ).fetchall()
+        if not rows:
+            return 0
+        updates = []
+        for note_id, content, kind in rows:
+            codec, value = self.db.encode_text(self.db.decode_text(content, kind))
+            if codec not in (kind, PLAIN) and (kind == PLAIN or len(value) < len(content)):
+                updates.append((value, codec, note_id, kind, content))
+        with self.db.transaction():
+            # заметку могли изменить, пока шла пачка: тогда её не трогаем
+            self.db.executemany("UPDATE notes SET content = ?, codec = ? "
+                                "WHERE id = ? AND codec = ? AND content = ?",
+                                updates)
+            self.db.execute("INSERT OR REPLACE INTO app_settings(key, value) VALUES(?, ?)",
+                            (BACKFILL_KEY, str(rows[-1][0])))
+        return len(rows)
@@ -0,0 +1,130 @@
+# pkm/core/codelex.py
+"""Построчный разбор fenced-блоков кода в заметках через Pygments.
+
+Подсветка в редакторе идёт по строкам, поэтому лексер запускается
+на одной строке с тем стеком состояний, на котором закончилась
+предыдущая, и возвращает стек, с которым закончилась эта. Стек
+вместе с языком и маркером блока и есть состояние строки: если оно
+не изменилось, следующие строки перелексировать не нужно.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from pygments.lexer import RegexLexer
+from pygments.token import Error, Whitespace, _TokenType
+from pygments.util import ClassNotFound
+
+FENCE_OPEN = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*([\w+#.-]*)")
+FENCE_CLOSE = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*$")
+
+# (начало, длина, тип токена)
+Token = Tuple[int, int, _TokenType]
+
+
+def fence_open(line: str) -> Optional[Tuple[str, str]]:
+    """Маркер и язык, если строка открывает блок кода."""
+    m = FENCE_OPEN.match(line)
+    if not m or (m.group(1)[0] == "`" and "`" in line[m.end():]):
+        return None
+    return m.group(1), m.group(2).lower()
+
+
+def fence_close(line: str, marker: str) -> bool:
+    m = FENCE_CLOSE.match(line)
+    return bool(m) and m.group(1)[0] == marker[0] and len(m.group(1)) >= len(marker)
+
+
+class LineLexer:
+    """Кэш лексеров по языку и разбор одной строки с заданным стеком."""
+
+    def __init__(self):
+        self.lexers = {}
+        self.aliases = None
+
+    def lexer(self, lang: str):
+        if lang not in self.lexers:
+            from pygments.lexers import get_all_lexers, get_lexer_by_name
+            if self.aliases is None:
+                # неизвестное имя get_lexer_by_name ищет и по плагинам, а это
+                # полсекунды на каждую букву недописанного ```pyth
+                self.aliases = {alias for _, aliases, _, _ in get_all_lexers(plugins=False)
+                                for alias in aliases}
+            try:
+                known = lang in self.aliases
+                self.lexers[lang] = get_lexer_by_name(lang) if known else None
+            except ClassNotFound:
+                self.lexers[lang] = None
+        return self.lexers[lang]
+
+    def lex(self, lang: str, line: str, stack: Tuple[str, ...]) -> Tuple[List[Token], Tuple[str, ...]]:
+        lexer = self.lexer(lang)
+        if lexer is None:
+            return [], stack
+        # строка с переводом, как её видит лексер в целом тексте
+        text = line + "\n"
+        if (not isinstance(lexer, RegexLexer)
+                or type(lexer).get_tokens_unprocessed is not RegexLexer.get_tokens_unprocessed):
+            # у лексера свой разбор -- стек не переносим, каждая строка с нуля
+            tokens = lexer.get_tokens_unprocessed(text)
+            return self._clip(tokens, len(line)), stack
+        tokens, stack = self._regex(lexer, text, stack)
+        return self._clip(tokens, len(line)), stack
+
+    @staticmethod
+    def _clip(tokens, size: int) -> List[Token]:
+        out = []
+        for pos, ttype, value in tokens:
+            if pos >= size:
+                break
+            out.append((pos, min(len(value), size - pos), ttype))
+        return out
+
+    @staticmethod
+    def _regex(lexer, text: str, stack):
+        """RegexLexer.get_tokens_unprocessed, который отдаёт и итоговый стек."""
+        tokens = []
+        pos = 0
+        tokendefs = lexer._tokens
+        statestack = list(stack)
+        statetokens = tokendefs[statestack[-1]]
+        while True:
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if not m:
+                    continue
+                if action is not None:
+                    if type(action) is _TokenType:
+                        tokens.append((pos, action, m.group()))
+                    else:
+                        tokens.extend(action(lexer, m))
+                pos = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == "#pop":
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == "#push":
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == "#push":
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                break
+            else:
+                if pos >= len(text):
+                    break
+                if text[pos] == "\n":
+                    statestack = ["root"]
+                    statetokens = tokendefs["root"]
+                    tokens.append((pos, Whitespace, "\n"))
+                else:
+                    tokens.append((pos, Error, text[pos]))
+                pos += 1
+        return tokens, tuple(statestack)
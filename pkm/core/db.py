@@ -0,0 +1,1082 @@
+# pkm/core/db.py
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Tuple, Optional, NamedTuple
+
+from pkm.core import chunks, codec, recur
+from pkm.core.events import NOTE_UPDATED, Event, EventBus
+from pkm.core.links import parse_links
+from pkm.core.instrument import QueryStats, Recorded, explain, SLOW_MS
+
+DATA_DIR = "./data"
+DB_PATH = "./data/pkm.sqlite3"
+PAGE_SIZE = 200
+# лимит переменных SQLite с запасом
+BATCH_SIZE = 500
+READERS = 4
+NOTE_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+
+FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content, tags)
+        VALUES (new.id, new.title,
+                CASE WHEN typeof(new.content) = 'text' THEN new.content END, '');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM notes_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content ON notes
+    WHEN old.title IS NOT new.title
+      OR (typeof(new.content) = 'text' AND old.content IS NOT new.content) BEGIN
+        -- у заметки из кусков content пуст, у сжатой -- blob;
+        -- в обоих случаях текст в индекс пишет save_note
+        UPDATE notes_fts SET title = new.title,
+            content = CASE WHEN typeof(new.content) = 'text'
+                           THEN new.content ELSE content END
+        WHERE rowid = new.id;
+    END
+    """,
+)
+
+
+# теги заметки в индекс пишет set_tags одним запросом: построчные триггеры
+# на note_tags переиндексировали всю строку FTS на каждый тег
+FTS_TAGS = """
+    UPDATE notes_fts SET tags = coalesce((
+        SELECT group_concat(t.name, ' ') FROM note_tags nt
+        JOIN tags t ON t.id = nt.tag_id
+        WHERE nt.note_id = ?
+    ), '') WHERE rowid = ?
+"""
+
+FTS_FILL = """
+    INSERT INTO notes_fts(rowid, title, content, tags)
+    SELECT n.id, n.title, n.content, coalesce((
+        SELECT group_concat(t.name, ' ') FROM note_tags nt
+        JOIN tags t ON t.id = nt.tag_id
+        WHERE nt.note_id = n.id
+    ), '') FROM notes n
+"""
+
+
+def read_chunks(conn, ids) -> bytes:
+    """Склеивает куски заметки, читая blob'ы напрямую, без SELECT."""
+    parts = []
+    for chunk_id in ids:
+        with conn.blobopen("note_chunks", "data", chunk_id, readonly=True) as blob:
+            parts.append(blob.read())
+    return b"".join(parts)
+
+
+def fts_query(text: str) -> str:
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def by_rank(search: str) -> bool:
+    """Сортирует ли запрос по rank (по возрастанию), а не по дате."""
+    search = search.strip()
+    return not search.startswith("#") and bool(fts_query(search))
+
+
+def notes_query(search: str, day: str, show_all: bool,
+                after: Optional[Tuple] = None, limit: int = PAGE_SIZE,
+                note_id: Optional[int] = None):
+    """Строки: id, title, created, snippet, ключ сортировки.
+
+    after -- (ключ, id) последней уже загруженной строки;
+    note_id -- строка только этой заметки, если она подходит под фильтр.
+    """
+    search = search.strip()
+    params = []
+
+    if search.startswith("#"):
+        sql = ("SELECT DISTINCT n.id, n.title, n.created, NULL, n.created "
+               "FROM notes n "
+               "JOIN note_tags nt ON n.id = nt.note_id "
+               "JOIN tags t ON nt.tag_id = t.id "
+               "WHERE t.name LIKE ?")
+        params.append(f"%{search[1:].strip()}%")
+        if not show_all:
+            sql += " AND n.created_date = ?"
+            params.append(day)
+        if note_id:
+            sql += " AND n.id = ?"
+            params.append(note_id)
+        if after:
+            sql += " AND (n.created, n.id) < (?, ?)"
+            params.extend(after)
+        sql += " ORDER BY n.created DESC, n.id DESC LIMIT ?"
+        params.append(limit)
+        return sql, tuple(params)
+
+    query = fts_query(search)
+    if query:
+        # сортировка по rank идёт по всем совпадениям, поэтому snippet()
+        # считается снаружи, только для строк, попавших в LIMIT
+        sql = ("SELECT n.id, n.title, n.created, rank "
+               "FROM notes_fts "
+               "JOIN notes n ON n.id = notes_fts.rowid "
+               "WHERE notes_fts MATCH ?")
+        params.append(query)
+        if not show_all:
+            sql += " AND n.created_date = ?"
+            params.append(day)
+        if note_id:
+            sql += " AND notes_fts.rowid = ?"
+            params.append(note_id)
+        if after:
+            sql += " AND (rank, n.id) > (?, ?)"
+            params.extend(after)
+        sql += " ORDER BY rank, n.id LIMIT ?"
+        params.append(limit)
+        sql = ("SELECT p.id, p.title, p.created, "
+               "snippet(notes_fts, -1, '[', ']', '…', 12), p.rank "
+               f"FROM ({sql}) p "
+               "JOIN notes_fts ON notes_fts.rowid = p.id "
+               "WHERE notes_fts MATCH ? "
+               "ORDER BY p.rank, p.id")
+        params.append(query)
+        return sql, tuple(params)
+
+    sql = "SELECT id, title, created, NULL, created FROM notes WHERE 1=1"
+    if not show_all:
+        sql += " AND created_date = ?"
+        params.append(day)
+    if note_id:
+        sql += " AND id = ?"
+        params.append(note_id)
+    if after:
+        sql += " AND (created, id) < (?, ?)"
+        params.extend(after)
+    sql += " ORDER BY created DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return sql, tuple(params)
+
+
+class Note(NamedTuple):
+    id: int
+    title: str
+    content: str
+    created: str
+    tags: List[str]
+    # (id, remind_at, mail_sent, rrule)
+    rems: List[Tuple]
+    # первое напоминание, уже разобранное в datetime
+    remind_at: Optional[datetime]
+    # id кусков по порядку; у больших заметок content пуст
+    chunks: Tuple[int, ...] = ()
+
+
+class NoteCache:
+    def __init__(self, size: int = NOTE_CACHE_SIZE):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, note_id: int):
+        note = self.items.get(note_id)
+        if note is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(note_id)
+        return note
+
+    def put(self, note: Note):
+        self.items[note.id] = note
+        self.items.move_to_end(note.id)
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+    def invalidate(self, *note_ids):
+        for note_id in note_ids:
+            self.items.pop(note_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class Database:
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        # в WAL-режиме NORMAL безопасен, fsync только на checkpoint
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA foreign_keys = ON;")
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.depth = 0
+        self.cache = NoteCache()
+        self.dictionaries = {}
+        self.events = EventBus()
+        self.stats = None
+        if os.environ.get("PKM_PROFILE"):
+            self.enable_stats()
+        self._init_db()
+
+        self.readers = queue.LifoQueue()
+        self.opened = 0
+        self.pool_lock = threading.Lock()
+
+    def _init_db(self) -> None:
+        migrations = (
+            self._schema_v1,
+            self._schema_v2,
+            self._schema_v3,
+            self._schema_v4,
+            self._schema_v5,
+            self._schema_v6,
+            self._schema_v7,
+            self._schema_v8,
+            self._schema_v9,
+            self._schema_v10,
+            self._schema_v11,
+            self._schema_v12,
+        )
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+        for number, migrate in enumerate(migrations[version:], version + 1):
+            cur = self.conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                migrate(cur)
+                cur.execute(f"PRAGMA user_version = {number}")
+            except Exception:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+
+    def _schema_v1(self, cur) -> None:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT,
+                content TEXT,
+                created TEXT
+            )
+            """
+        )
+
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE
+            )
+            """
+        )
+
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS note_tags (
+                note_id INTEGER,
+                tag_id INTEGER,
+                PRIMARY KEY(note_id, tag_id)
+            )
+            """
+        )
+
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reminders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                note_id INTEGER,
+                remind_at TEXT,
+                mail_sent INTEGER DEFAULT 0
+            )
+            """
+        )
+
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS app_settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+            """
+        )
+
+    def _schema_v2(self, cur) -> None:
+        cur.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                title, content, tags,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+            """
+        )
+        for trigger in FTS_TRIGGERS:
+            cur.execute(trigger)
+
+        cur.execute("DELETE FROM notes_fts")
+        cur.execute(FTS_FILL)
+        # заголовок весит больше тегов, теги больше текста
+        cur.execute("INSERT INTO notes_fts(notes_fts, rank) "
+                    "VALUES('rank', 'bm25(10.0, 1.0, 5.0)')")
+        cur.execute("DELETE FROM app_settings WHERE key='fts_built'")
+
+    def _schema_v3(self, cur) -> None:
+        # ALTER TABLE не умеет добавлять STORED-колонку, но индекс
+        # по VIRTUAL-колонке хранит вычисленное значение сам
+        cur.execute("ALTER TABLE notes ADD COLUMN created_date TEXT "
+                    "GENERATED ALWAYS AS (DATE(created)) VIRTUAL")
+
+        cur.execute(
+            """
+            CREATE TABLE note_tags_new (
+                note_id INTEGER NOT NULL
+                    REFERENCES notes(id) ON DELETE CASCADE,
+                tag_id INTEGER NOT NULL
+                    REFERENCES tags(id) ON DELETE CASCADE,
+                PRIMARY KEY(note_id, tag_id)
+            )
+            """
+        )
+        cur.execute("INSERT INTO note_tags_new(note_id, tag_id) "
+                    "SELECT note_id, tag_id FROM note_tags "
+                    "WHERE note_id IN (SELECT id FROM notes) "
+                    "AND tag_id IN (SELECT id FROM tags)")
+        cur.execute("DROP TABLE note_tags")
+        cur.execute("ALTER TABLE note_tags_new RENAME TO note_tags")
+
+        cur.execute(
+            """
+            CREATE TABLE reminders_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                note_id INTEGER NOT NULL
+                    REFERENCES notes(id) ON DELETE CASCADE,
+                remind_at TEXT,
+                mail_sent INTEGER DEFAULT 0
+            )
+            """
+        )
+        cur.execute("INSERT INTO reminders_new(id, note_id, remind_at, mail_sent) "
+                    "SELECT id, note_id, remind_at, mail_sent FROM reminders "
+                    "WHERE note_id IN (SELECT id FROM notes)")
+        cur.execute("DROP TABLE reminders")
+        cur.execute("ALTER TABLE reminders_new RENAME TO reminders")
+
+        # триггеры note_tags удалились вместе со старой таблицей,
+        # а новые не нужны: теги в индекс пишет set_tags
+
+        cur.execute("CREATE INDEX idx_notes_created "
+                    "ON notes(created)")
+        cur.execute("CREATE INDEX idx_notes_created_date "
+                    "ON notes(created_date, created)")
+        cur.execute("CREATE INDEX idx_notes_title "
+                    "ON notes(title, created_date)")
+        cur.execute("CREATE INDEX idx_note_tags_tag "
+                    "ON note_tags(tag_id, note_id)")
+        cur.execute("CREATE INDEX idx_reminders_note "
+                    "ON reminders(note_id, remind_at)")
+        cur.execute("CREATE INDEX idx_reminders_due "
+                    "ON reminders(mail_sent, remind_at)")
+
+    def _schema_v4(self, cur) -> None:
+        cur.execute("CREATE INDEX idx_reminders_at "
+                    "ON reminders(remind_at)")
+
+    def _schema_v5(self, cur) -> None:
+        cur.execute(
+            """
+            CREATE TABLE note_chunks (
+                id INTEGER PRIMARY KEY,
+                note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+                digest BLOB NOT NULL,
+                data BLOB NOT NULL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX idx_note_chunks_note "
+                    "ON note_chunks(note_id, digest)")
+        cur.execute("ALTER TABLE notes ADD COLUMN chunk_map BLOB")
+        cur.execute("DROP TRIGGER notes_fts_au")
+        for trigger in FTS_TRIGGERS:
+            cur.execute(trigger)
+
+    def _schema_v6(self, cur) -> None:
+        # словарь и векторы для похожих заметок (pkm.core.related)
+        cur.execute(
+            """
+            CREATE TABLE terms (
+                id INTEGER PRIMARY KEY,
+                term TEXT NOT NULL UNIQUE,
+                df INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE note_vectors (
+                note_id INTEGER PRIMARY KEY REFERENCES notes(id) ON DELETE CASCADE,
+                terms BLOB NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE note_terms (
+                note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+                term_id INTEGER NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (note_id, term_id)
+            ) WITHOUT ROWID
+            """
+        )
+        cur.execute("CREATE INDEX idx_note_terms_term "
+                    "ON note_terms(term_id, weight DESC, note_id)")
+
+    def _schema_v7(self, cur) -> None:
+        cur.execute(
+            """
+            CREATE TABLE links (
+                source_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+                target TEXT NOT NULL,
+                target_id INTEGER REFERENCES notes(id) ON DELETE SET NULL,
+                PRIMARY KEY (source_id, target)
+            ) WITHOUT ROWID
+            """
+        )
+        cur.execute("CREATE INDEX idx_links_target ON links(target)")
+        cur.execute("CREATE INDEX idx_links_target_id ON links(target_id)")
+
+        # ссылки из уже существующих заметок, один проход при обновлении
+        rows = cur.execute("SELECT id, content, chunk_map FROM notes "
+                           "WHERE content LIKE '%[[%' OR chunk_map IS NOT NULL"
+                           ).fetchall()
+        for note_id, content, chunk_map in rows:
+            if chunk_map:
+                content = read_chunks(self.conn, chunks.unpack(chunk_map)).decode("utf-8")
+            cur.executemany("INSERT INTO links(source_id, target) VALUES(?, ?)",
+                            [(note_id, t) for t in parse_links(content)])
+        cur.execute("UPDATE links SET target_id = "
+                    "(SELECT id FROM notes n WHERE n.title = links.target "
+                    " ORDER BY n.created DESC, n.id DESC LIMIT 1)")
+
+    def _schema_v8(self, cur) -> None:
+        # base -- предыдущая ревизия, к которой data -- дельта;
+        # NULL -- в data полный текст
+        cur.execute(
+            """
+            CREATE TABLE revisions (
+                id INTEGER PRIMARY KEY,
+                note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+                seq INTEGER NOT NULL,
+                created TEXT NOT NULL,
+                title TEXT,
+                base INTEGER,
+                depth INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                digest BLOB NOT NULL,
+                data BLOB NOT NULL,
+                UNIQUE (note_id, seq)
+            )
+            """
+        )
+
+    def _schema_v9(self, cur) -> None:
+        # 0 -- текст, 1 -- zlib, 2+ -- zlib со словарём codecs.id (pkm.core.codec)
+        cur.execute("ALTER TABLE notes ADD COLUMN codec INTEGER NOT NULL DEFAULT 0")
+        cur.execute(
+            """
+            CREATE TABLE codecs (
+                id INTEGER PRIMARY KEY,
+                dictionary BLOB NOT NULL
+            )
+            """
+        )
+        cur.execute("DROP TRIGGER notes_fts_ai")
+        cur.execute("DROP TRIGGER notes_fts_au")
+        for trigger in FTS_TRIGGERS:
+            cur.execute(trigger)
+
+    def _schema_v10(self, cur) -> None:
+        # правило повтора с DTSTART (pkm.core.recur); remind_at -- ближайшее повторение
+        cur.execute("ALTER TABLE reminders ADD COLUMN rrule TEXT")
+
+    def _schema_v11(self, cur) -> None:
+        # хеш текста и MinHash-подпись для поиска дубликатов (pkm.core.duplicates);
+        # подписи старых заметок достраивает фоновый проход
+        cur.execute(
+            """
+            CREATE TABLE note_sigs (
+                note_id INTEGER PRIMARY KEY REFERENCES notes(id) ON DELETE CASCADE,
+                hash BLOB,
+                sig BLOB
+            )
+            """
+        )
+        cur.execute("CREATE INDEX idx_note_sigs_hash ON note_sigs(hash)")
+        cur.execute(
+            """
+            CREATE TABLE note_lsh (
+                bucket INTEGER NOT NULL,
+                note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+                PRIMARY KEY (bucket, note_id)
+            ) WITHOUT ROWID
+            """
+        )
+        cur.execute("CREATE INDEX idx_note_lsh_note ON note_lsh(note_id)")
+
+    def _schema_v12(self, cur) -> None:
+        # теги в индекс пишет set_tags (FTS_TAGS), по разу на вызов
+        cur.execute("DROP TRIGGER IF EXISTS note_tags_fts_ai")
+        cur.execute("DROP TRIGGER IF EXISTS note_tags_fts_ad")
+
+    def _open_reader(self):
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Соединение только для чтения из пула; можно брать из любого потока."""
+        try:
+            conn = self.readers.get_nowait()
+        except queue.Empty:
+            with self.pool_lock:
+                spawn = self.opened < READERS
+                if spawn:
+                    self.opened += 1
+            if not spawn:
+                conn = self.readers.get()
+            else:
+                try:
+                    conn = self._open_reader()
+                except sqlite3.Error:
+                    with self.pool_lock:
+                        self.opened -= 1
+                    raise
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self.readers.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Всё внутри блока уходит одним коммитом; вложенные блоки
+        присоединяются к внешнему.
+
+        Блокировка записи берётся сразу: транзакция, начатая чтением, не
+        может потом писать, если между ними закоммитило другое
+        соединение (фоновые потоки), и busy_timeout тут не помогает.
+        """
+        if self.depth == 0:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self.depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.depth -= 1
+            if self.depth == 0:
+                self.conn.rollback()
+                # в кэш могли попасть незакоммиченные версии заметок
+                self.cache.clear()
+                self.events.discard()
+                if self.stats:
+                    self.stats.rollback()
+            raise
+        self.depth -= 1
+        if self.depth == 0:
+            self._commit()
+            self.events.flush()
+
+    def emit(self, kind: str, before: Optional[Note], after: Optional[Note]):
+        """Событие уходит подписчикам после коммита текущей транзакции."""
+        self.events.post(Event(kind, before, after))
+        if self.depth == 0:
+            self.events.flush()
+
+    @contextmanager
+    def bulk_fts(self):
+        """Снимает FTS-триггеры на время массовой записи.
+
+        Построчные триггеры в разы медленнее одного INSERT ... SELECT,
+        поэтому вызывающий сам дозаполняет индекс через fill_fts.
+        Работает только внутри transaction().
+        """
+        if self.depth == 0:
+            raise RuntimeError("bulk_fts() requires an open transaction")
+        for trigger in FTS_TRIGGERS:
+            name = re.search(r"EXISTS (\w+)", trigger).group(1)
+            self.execute(f"DROP TRIGGER IF EXISTS {name}")
+        try:
+            yield self
+        finally:
+            for trigger in FTS_TRIGGERS:
+                self.execute(trigger)
+
+    def fill_fts(self, first: int, last: int):
+        self.execute(FTS_FILL + " WHERE n.id BETWEEN ? AND ?", (first, last))
+
+    def enable_stats(self, slow_ms: float = SLOW_MS) -> QueryStats:
+        """Включает замеры всех запросов; выключено по умолчанию."""
+        if self.stats is None:
+            self.stats = QueryStats(slow_ms)
+        return self.stats
+
+    def _commit(self):
+        if self.stats and self.conn.in_transaction:
+            self.stats.commit()
+        self.conn.commit()
+
+    def execute(self, sql, params: Tuple = ()):
+        cur = self.conn.cursor()
+        if self.stats is None:
+            cur.execute(sql, params)
+        else:
+            # под замером результат выбирается сразу: SQLite работает
+            # лениво, и время одного execute не отражало бы запрос
+            start = time.perf_counter()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            ms = (time.perf_counter() - start) * 1000
+            self.stats.record(sql, params, ms,
+                              len(rows) if cur.description else cur.rowcount,
+                              lambda: explain(self.conn, sql, params))
+            cur = Recorded(cur, rows)
+        if self.depth == 0:
+            self._commit()
+        return cur
+
+    def executemany(self, sql, seq_of_params):
+        cur = self.conn.cursor()
+        start = time.perf_counter()
+        cur.executemany(sql, seq_of_params)
+        if self.stats is not None:
+            ms = (time.perf_counter() - start) * 1000
+            self.stats.record(sql, "executemany", ms, cur.rowcount)
+        if self.depth == 0:
+            self._commit()
+        return cur
+
+    def get_password(self):
+        row = self.execute("SELECT value FROM app_settings "
+                           "WHERE key='password'"
+                           ).fetchone()
+        return row[0] if row else None
+
+    def set_password(self, password):
+        hashed = hashlib.sha256(password.encode()).hexdigest()
+        self.execute("INSERT OR REPLACE INTO app_settings(key, value) "
+                     "VALUES('password', ?)",
+                     (hashed,))
+
+
+    def verify(self, password):
+        hashed = hashlib.sha256(password.encode()).hexdigest()
+        row = self.execute("SELECT value FROM app_settings "
+                           "WHERE key='password'"
+                           ).fetchone()
+        return bool(row[0] == hashed)
+
+    def add_tag(self, name):
+        name = name.strip()
+        if not name:
+            raise ValueError("Tag name is empty")
+        return self.add_tags([name])[name]
+
+    def add_tags(self, names) -> dict:
+        """Upsert пачкой: {имя: id} для всех переданных тегов."""
+        names = list(dict.fromkeys(names))
+        ids = {}
+        with self.transaction():
+            for i in range(0, len(names), BATCH_SIZE):
+                chunk = names[i:i + BATCH_SIZE]
+                values = ", ".join("(?)" for _ in chunk)
+                rows = self.execute(
+                    f"INSERT INTO tags(name) VALUES {values} "
+                    "ON CONFLICT(name) DO UPDATE SET name = excluded.name "
+                    "RETURNING id, name",
+                    tuple(chunk)
+                ).fetchall()
+                ids.update((name, tag_id) for tag_id, name in rows)
+        return ids
+
+    def set_tags(self, note_id: int, tags):
+        self.cache.invalidate(note_id)
+        names = [t.strip() for t in tags if t.strip()]
+        with self.transaction():
+            wanted = set(self.add_tags(names).values()) if names else set()
+            current = {r[0] for r in self.execute(
+                "SELECT tag_id FROM note_tags "
+                "WHERE note_id = ?",
+                (note_id,)
+            ).fetchall()}
+
+            self.executemany("DELETE FROM note_tags "
+                             "WHERE note_id = ? AND tag_id = ?",
+                             [(note_id, t) for t in current - wanted]
+                             )
+            self.executemany("INSERT OR IGNORE INTO note_tags(note_id, tag_id) "
+                             "VALUES(?, ?)",
+                             [(note_id, t) for t in wanted - current]
+                             )
+            if wanted != current:
+                self.execute(FTS_TAGS, (note_id, note_id))
+
+    def get_tags(self, note_id: int):
+        cur = self.execute(
+            "SELECT t.name FROM tags t "
+            "JOIN note_tags nt ON t.id=nt.tag_id "
+            "WHERE nt.note_id = ?",
+            (note_id,)
+        )
+        return [r[0] for r in cur.fetchall()]
+
+    def add_rem(self, note_id: int, remind_at: str, rrule: Optional[str] = None,
+                sent: int = 0):
+        self.cache.invalidate(note_id)
+        cur = self.execute("INSERT INTO reminders(note_id, remind_at, mail_sent, rrule) "
+                           "VALUES(?, ?, ?, ?)",
+                           (note_id, remind_at, sent, rrule))
+        return cur.lastrowid
+
+    def get_rem(self, note_id: int):
+        cur = self.execute("SELECT id, remind_at, mail_sent FROM reminders "
+                           "WHERE note_id = ? "
+                           "ORDER BY remind_at ASC", (note_id,))
+        return cur.fetchall()
+
+    def del_rem(self, reminder_id: int):
+        rows = self.execute("DELETE FROM reminders "
+                            "WHERE id = ? RETURNING note_id",
+                            (reminder_id,)).fetchall()
+        self.cache.invalidate(*(r[0] for r in rows))
+
+    def get_rems(self, current_datetime: str):
+        cur = self.execute(
+            "SELECT r.id, r.note_id, r.remind_at, n.title FROM reminders r "
+            "JOIN notes n ON n.id = r.note_id "
+            "WHERE r.remind_at <= ? AND r.mail_sent = 0",
+            (current_datetime,)
+        )
+        return cur.fetchall()
+
+    def pending_rems(self):
+        return self.execute("SELECT id, note_id, remind_at FROM reminders "
+                            "WHERE mail_sent = 0 AND remind_at IS NOT NULL"
+                            ).fetchall()
+
+    def get_rems_by_id(self, ids):
+        rows = []
+        for i in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[i:i + BATCH_SIZE]
+            marks = ", ".join("?" for _ in chunk)
+            rows += self.execute(
+                "SELECT r.id, r.note_id, r.remind_at, n.title FROM reminders r "
+                "JOIN notes n ON n.id = r.note_id "
+                f"WHERE r.id IN ({marks}) AND r.mail_sent = 0 "
+                "ORDER BY r.remind_at ASC",
+                tuple(chunk)
+            ).fetchall()
+        return rows
+
+    def fire_rems(self, ids, now: datetime):
+        """Отмечает сработавшие напоминания. Повторяющиеся не гаснут,
+        а переезжают на следующее после now повторение."""
+        rows = []
+        for i in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[i:i + BATCH_SIZE]
+            marks = ", ".join("?" for _ in chunk)
+            rows += self.execute("SELECT id, note_id, rrule FROM reminders "
+                                 f"WHERE id IN ({marks}) AND rrule IS NOT NULL",
+                                 tuple(chunk)
+                                 ).fetchall()
+        moved = {}
+        for rem_id, note_id, rrule in rows:
+            upcoming = recur.next_after(rrule, now)
+            if upcoming:
+                moved[rem_id] = (upcoming.strftime("%Y-%m-%d %H:%M:%S"), note_id)
+
+        with self.transaction():
+            self.mark_rems([i for i in ids if i not in moved])
+            before = {note_id: self.load_note(note_id) for _, note_id in moved.values()}
+            self.executemany("UPDATE reminders SET remind_at = ? WHERE id = ?",
+                             [(at, rem_id) for rem_id, (at, _) in moved.items()])
+            self.cache.invalidate(*before)
+            # очередь и календарь узнают о новом повторении с шины
+            for note_id, note in before.items():
+                if note:
+                    self.emit(NOTE_UPDATED, note, self.load_note(note_id))
+
+    def mark_rem(self, reminder_id: int):
+        self.mark_rems([reminder_id])
+
+    def mark_rems(self, ids):
+        with self.transaction():
+            for i in range(0, len(ids), BATCH_SIZE):
+                chunk = ids[i:i + BATCH_SIZE]
+                marks = ", ".join("?" for _ in chunk)
+                rows = self.execute("UPDATE reminders SET mail_sent = 1 "
+                                    f"WHERE id IN ({marks}) RETURNING note_id",
+                                    tuple(chunk)
+                                    ).fetchall()
+                self.cache.invalidate(*(r[0] for r in rows))
+
+    def get_note(self, note_id: int):
+        row = self.execute("SELECT id, title, content, created, codec FROM notes "
+                           "WHERE id = ?",
+                           (note_id,)
+                           ).fetchone()
+        if not row:
+            return None
+        return row[0], row[1], self.decode_text(row[2], row[4]), row[3]
+
+    def dictionary(self, codec_id: int) -> Optional[bytes]:
+        if codec_id not in self.dictionaries:
+            row = self.execute("SELECT dictionary FROM codecs WHERE id = ?",
+                               (codec_id,)
+                               ).fetchone()
+            self.dictionaries[codec_id] = row[0] if row else None
+        return self.dictionaries[codec_id]
+
+    def encode_text(self, text: str) -> Tuple[int, object]:
+        """(codec, content) для записи; словарь -- самый новый."""
+        row = self.execute("SELECT max(id) FROM codecs").fetchone()
+        dict_id = row[0]
+        return codec.encode(text, dict_id, self.dictionary(dict_id) if dict_id else None)
+
+    def decode_text(self, value, codec_id: int) -> Optional[str]:
+        if not codec_id or value is None:
+            return value
+        dictionary = self.dictionary(codec_id) if codec_id != codec.ZLIB else None
+        return codec.decompress(value, dictionary).decode("utf-8")
+
+    def load_note(self, note_id: int) -> Optional[Note]:
+        """Заметка с тегами и напоминаниями одним запросом, через LRU-кэш."""
+        note = self.cache.get(note_id)
+        if note is not None:
+            return note
+
+        row = self.execute(
+            "SELECT n.id, n.title, n.content, n.created, n.chunk_map, n.codec, "
+            "(SELECT json_group_array(t.name) FROM note_tags nt "
+            " JOIN tags t ON t.id = nt.tag_id WHERE nt.note_id = n.id), "
+            "(SELECT json_group_array(json_array(r.id, r.remind_at, r.mail_sent, r.rrule)) "
+            " FROM (SELECT id, remind_at, mail_sent, rrule FROM reminders "
+            "       WHERE note_id = n.id ORDER BY remind_at) r) "
+            "FROM notes n WHERE n.id = ?",
+            (note_id,)
+        ).fetchone()
+        if not row:
+            return None
+
+        rems = [tuple(r) for r in json.loads(row[7])]
+        remind_at = None
+        if rems:
+            try:
+                remind_at = datetime.strptime(rems[0][1], "%Y-%m-%d %H:%M:%S")
+            except (TypeError, ValueError):
+                pass
+        note = Note(row[0], row[1], self.decode_text(row[2], row[5]), row[3],
+                    json.loads(row[6]), rems, remind_at, chunks.unpack(row[4]))
+        self.cache.put(note)
+        return note
+
+    def read_chunk(self, chunk_id: int) -> str:
+        return read_chunks(self.conn, (chunk_id,)).decode("utf-8")
+
+    def note_text(self, note: Note) -> str:
+        if note.chunks:
+            return read_chunks(self.conn, note.chunks).decode("utf-8")
+        return note.content or ""
+
+    def write_chunks(self, note_id: int, parts) -> bool:
+        """Раскладывает текст заметки по note_chunks, трогая только
+        изменившиеся куски. Пустой parts убирает куски совсем.
+
+        Возвращает True, если что-то было записано.
+        """
+        rows = self.execute("SELECT id, digest, length(data) FROM note_chunks "
+                            "WHERE note_id = ?",
+                            (note_id,)
+                            ).fetchall()
+        if not rows and not parts:
+            return False
+
+        same = {}
+        sizes = {}
+        for chunk_id, digest, size in rows:
+            same.setdefault(digest, []).append(chunk_id)
+            sizes[chunk_id] = size
+
+        ids = []
+        fresh = []
+        for part in parts:
+            digest = chunks.digest(part)
+            if same.get(digest):
+                ids.append(same[digest].pop())
+            else:
+                fresh.append((len(ids), part, digest))
+                ids.append(None)
+        unused = [chunk_id for free in same.values() for chunk_id in free]
+
+        for pos, part, digest in fresh:
+            # blob не меняет длину, поэтому на месте переписывается
+            # только освободившийся кусок того же размера
+            chunk_id = next((i for i in unused if sizes[i] == len(part)), None)
+            if chunk_id:
+                unused.remove(chunk_id)
+                self.execute("UPDATE note_chunks SET digest = ? WHERE id = ?",
+                             (digest, chunk_id))
+            else:
+                chunk_id = self.execute(
+                    "INSERT INTO note_chunks(note_id, digest, data) "
+                    "VALUES(?, ?, zeroblob(?))",
+                    (note_id, digest, len(part))
+                ).lastrowid
+            with self.conn.blobopen("note_chunks", "data", chunk_id) as blob:
+                blob.write(part)
+            ids[pos] = chunk_id
+
+        for i in range(0, len(unused), BATCH_SIZE):
+            batch = unused[i:i + BATCH_SIZE]
+            marks = ", ".join("?" for _ in batch)
+            self.execute(f"DELETE FROM note_chunks WHERE id IN ({marks})", tuple(batch))
+
+        if fresh or unused:
+            self.execute("UPDATE notes SET chunk_map = ? WHERE id = ?",
+                         (chunks.pack(ids) if ids else None, note_id))
+        return bool(fresh or unused)
+
+    def day_counts(self, first: str, last: str) -> dict:
+        """{дата: [заметок, напоминаний]} для дней first..last включительно."""
+        counts = {}
+        rows = self.execute(
+            "SELECT created_date, COUNT(*), 0 FROM notes "
+            "WHERE created_date BETWEEN ? AND ? "
+            "GROUP BY created_date "
+            "UNION ALL "
+            "SELECT substr(remind_at, 1, 10), 0, COUNT(*) FROM reminders "
+            "WHERE remind_at >= ? AND remind_at < ? "
+            "AND remind_at = datetime(remind_at) "
+            "GROUP BY 1",
+            (first, last, first, last + "~")
+        ).fetchall()
+        for day, notes, rems in rows:
+            entry = counts.setdefault(day, [0, 0])
+            entry[0] += notes
+            entry[1] += rems
+        return counts
+
+    def find_notes(self, search: str, day: str, show_all: bool,
+                   after: Optional[Tuple] = None, limit: int = PAGE_SIZE,
+                   note_id: Optional[int] = None):
+        sql, params = notes_query(search, day, show_all, after, limit, note_id)
+        return self.execute(sql, params).fetchall()
+
+    def save_note(self, note_id: Optional[int], title: str, content: str,
+                  tags, remind_at: Optional[str] = None,
+                  rrule: Optional[str] = None) -> int:
+        self.cache.invalidate(note_id)
+        data = content.encode("utf-8")
+        big = len(data) > chunks.THRESHOLD
+        kind, inline = (codec.PLAIN, None) if big else self.encode_text(content)
+        with self.transaction():
+            # сжатый текст в индекс пишем сами, если он правда изменился
+            fts = kind != codec.PLAIN
+            if note_id:
+                if fts:
+                    old = self.execute("SELECT content FROM notes WHERE id = ?",
+                                       (note_id,)
+                                       ).fetchone()
+                    fts = not old or old[0] != inline
+                self.execute("UPDATE notes "
+                             "SET title = ?, content = ?, codec = ? "
+                             "WHERE id = ?",
+                             (title, inline, kind, note_id)
+                             )
+            else:
+                note_id = self.execute(
+                    "INSERT INTO notes(title, content, codec, created) "
+                    "VALUES(?, ?, ?, datetime('now'))",
+                    (title, inline, kind)
+                ).lastrowid
+
+            if self.write_chunks(note_id, chunks.split(data) if big else ()) and big:
+                fts = True
+            if fts:
+                self.execute("UPDATE notes_fts SET content = ? WHERE rowid = ?",
+                             (content, note_id))
+
+            self.set_tags(note_id, tags)
+
+            sent = 0
+            if rrule:
+                # храним ближайшее повторение, а не начало правила
+                now = datetime.now()
+                upcoming = recur.next_after(rrule, now, inc=True)
+                if not upcoming:
+                    # повторы кончились: строка остаётся с последним из них,
+                    # отмеченная сработавшей, а не пропадает молча
+                    upcoming, sent = recur.last_before(rrule, now), 1
+                remind_at = upcoming.strftime("%Y-%m-%d %H:%M:%S") if upcoming else None
+
+            rems = self.get_rem(note_id)
+            if not remind_at:
+                self.execute("DELETE FROM reminders "
+                             "WHERE note_id = ?",
+                             (note_id,))
+            elif rems:
+                self.execute("UPDATE reminders "
+                             "SET remind_at = ?, mail_sent = ?, rrule = ? "
+                             "WHERE id = ?",
+                             (remind_at, sent, rrule, rems[0][0])
+                             )
+            else:
+                self.add_rem(note_id, remind_at, rrule, sent)
+        return note_id
+
+    def delete_note(self, note_id: int):
+        self.cache.invalidate(note_id)
+        # теги и напоминания удаляются каскадом
+        self.execute("DELETE FROM notes "
+                     "WHERE id = ?",
+                     (note_id,)
+                     )
+
+    def close(self):
+        while self.opened:
+            self.readers.get().close()
+            self.opened -= 1
+        self.conn.close()
@@ -0,0 +1,239 @@
+# pkm/core/duplicates.py
+"""Дубликаты и почти-дубликаты заметок.
+
+У каждой заметки в note_sigs лежат хеш текста без учёта пробелов
+(совпал -- точный дубликат, ищется по индексу) и MinHash-подпись:
+NUM_HASHES минимумов по шинглам из SHINGLE слов. Доля совпавших
+минимумов -- оценка сходства по Жаккару. Подпись режется на BANDS
+полос по ROWS значений, каждая полоса -- корзина LSH в note_lsh.
+Заметки со сходством от 0.8 делят хоть одну корзину почти наверняка
+(промах меньше 0.1%), поэтому поиск читает только свои корзины, а
+отчёт по всей базе проходит note_lsh один раз и сравнивает заметку
+лишь с несколькими представителями корзины -- время растёт с числом
+заметок линейно.
+"""
+import hashlib
+import re
+import zlib
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+from pkm.core.db import BATCH_SIZE, read_chunks
+from pkm.core import chunks
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+SHINGLE = 3
+THRESHOLD = 0.8
+# сколько непохожих друг на друга заметок одной корзины сравнивает отчёт
+REPRESENTATIVES = 16
+# подпись длинного текста строится по началу
+TEXT_LIMIT = 256 * 1024
+WORD = re.compile(r"\w+")
+
+
+def _seed(name: str, i: int) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{name}{i}".encode(), digest_size=8).digest(), "little")
+
+
+# хеш-функции подписи: (a * x + b) mod 2**64, старшие 32 бита; a нечётное.
+# Коэффициенты не случайные, а выведены из номера -- подписи из разных
+# запусков сравнимы
+A = [_seed("a", i) | 1 for i in range(NUM_HASHES)]
+B = [_seed("b", i) for i in range(NUM_HASHES)]
+
+
+def content_hash(text: str) -> Optional[bytes]:
+    """Хеш текста без учёта пробелов и переводов строк; None для пустого."""
+    text = " ".join((text or "").split())
+    if not text:
+        return None
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def signature(text: str) -> Optional[bytes]:
+    """MinHash-подпись NUM_HASHES x uint32; None, если слов нет."""
+    words = WORD.findall((text or "")[:TEXT_LIMIT].lower())
+    if not words:
+        return None
+    # numpy нужен только здесь, не тянем его на старте
+    import numpy as np
+
+    size = min(SHINGLE, len(words))
+    shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                    dtype=np.uint64, count=len(shingles))
+    a = np.array(A, dtype=np.uint64)[:, None]
+    b = np.array(B, dtype=np.uint64)[:, None]
+    # по частям: матрица NUM_HASHES x шинглы для длинного текста велика
+    low = np.full(NUM_HASHES, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for i in range(0, len(x), 4096):
+        hashed = (a * x[None, i:i + 4096] + b) >> np.uint64(32)
+        np.minimum(low, hashed.min(axis=1), out=low)
+    return low.astype("<u4").tobytes()
+
+
+def buckets(sig: bytes) -> List[int]:
+    """Корзины LSH: по одной на полосу, номер полосы входит в ключ."""
+    width = ROWS * 4
+    return [int.from_bytes(hashlib.blake2b(bytes([band]) + sig[band * width:(band + 1) * width],
+                                           digest_size=8).digest(),
+                           "little", signed=True)
+            for band in range(BANDS)]
+
+
+def similarity(first: bytes, second: bytes) -> float:
+    """Оценка сходства по Жаккару: доля совпавших значений подписи."""
+    same = sum(x == y for x, y in zip(memoryview(first).cast("I"), memoryview(second).cast("I")))
+    return same / NUM_HASHES
+
+
+class Duplicates:
+    def __init__(self, db):
+        self.db = db
+
+    def update(self, note_id: int, content: str):
+        self._write({note_id: content})
+
+    def find(self, content: str, exclude: Optional[int] = None,
+             threshold: float = THRESHOLD, limit: int = 5) -> List[Tuple[int, str, str, float]]:
+        """(id, title, created, сходство) для заметок, повторяющих текст.
+
+        Точные совпадения идут первыми со сходством 1.0.
+        """
+        found = {}
+        digest = content_hash(content)
+        if digest:
+            for (note_id,) in self.db.execute("SELECT note_id FROM note_sigs WHERE hash = ?",
+                                              (digest,)):
+                found[note_id] = 1.0
+
+        sig = signature(content)
+        if sig:
+            keys = buckets(sig)
+            marks = ", ".join("?" for _ in keys)
+            rows = self.db.execute(
+                "SELECT s.note_id, s.sig FROM note_sigs s WHERE s.note_id IN "
+                f"(SELECT note_id FROM note_lsh WHERE bucket IN ({marks}))",
+                tuple(keys)
+            ).fetchall()
+            for note_id, other in rows:
+                score = similarity(sig, other)
+                if score >= threshold:
+                    found.setdefault(note_id, score)
+        found.pop(exclude, None)
+        if not found:
+            return []
+
+        best = sorted(found.items(), key=itemgetter(1), reverse=True)[:limit]
+        score = dict(best)
+        marks = ", ".join("?" for _ in score)
+        rows = self.db.execute(f"SELECT id, title, created FROM notes WHERE id IN ({marks})",
+                               tuple(score)
+                               ).fetchall()
+        return sorted(((i, title, created, score[i]) for i, title, created in rows),
+                      key=itemgetter(3), reverse=True)
+
+    def report(self, threshold: float = THRESHOLD) -> List[List[Tuple[int, str, str, float]]]:
+        """Группы повторяющихся заметок по всей базе, крупные первыми.
+
+        В группе (id, title, created, сходство с первой заметкой группы).
+        """
+        sigs = dict(self.db.execute("SELECT note_id, sig FROM note_sigs WHERE sig IS NOT NULL"))
+        parent = {}
+
+        def root(x):
+            while parent.get(x, x) != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        def join(x, y):
+            x, y = sorted((root(x), root(y)))
+            if x != y:
+                parent.setdefault(x, x)
+                parent[y] = x
+
+        # точные дубликаты -- по индексу хеша, без сравнения подписей
+        rows = self.db.execute("SELECT hash, note_id FROM note_sigs "
+                               "WHERE hash IS NOT NULL ORDER BY hash")
+        for _, group in groupby(rows, key=itemgetter(0)):
+            first = next(group)[1]
+            for _, note_id in group:
+                join(first, note_id)
+
+        # ORDER BY совпадает с ключом таблицы и сортировки не требует. Заметка
+        # сравнивается не со всеми в корзине, а с представителями уже
+        # найденных в ней групп, и их не больше REPRESENTATIVES
+        rows = self.db.execute("SELECT bucket, note_id FROM note_lsh ORDER BY bucket")
+        for _, group in groupby(rows, key=itemgetter(0)):
+            heads = [next(group)[1]]
+            for _, note_id in group:
+                for head in heads:
+                    if root(head) == root(note_id) or similarity(sigs[head], sigs[note_id]) >= threshold:
+                        join(head, note_id)
+                        break
+                else:
+                    if len(heads) < REPRESENTATIVES:
+                        heads.append(note_id)
+
+        found: Dict[int, List[int]] = {}
+        for note_id in sorted(parent):
+            found.setdefault(root(note_id), []).append(note_id)
+        groups = list(found.values())
+
+        notes = {}
+        ids = [note_id for members in groups for note_id in members]
+        for i in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[i:i + BATCH_SIZE]
+            marks = ", ".join("?" for _ in chunk)
+            notes.update((note_id, (title, created)) for note_id, title, created in self.db.execute(
+                f"SELECT id, title, created FROM notes WHERE id IN ({marks})", tuple(chunk)))
+
+        result = []
+        for head, *rest in groups:
+            group = [(head, *notes[head], 1.0)]
+            for note_id in rest:
+                score = similarity(sigs[head], sigs[note_id]) if head in sigs and note_id in sigs else 1.0
+                group.append((note_id, *notes[note_id], score))
+            result.append(group)
+        result.sort(key=lambda group: (-len(group), group[0][0]))
+        return result
+
+    def backfill(self, limit: int = 500) -> int:
+        """Подписи для заметок, у которых их ещё нет. Возвращает, скольким построено."""
+        rows = self.db.execute(
+            "SELECT n.id, n.content, n.chunk_map, n.codec FROM notes n "
+            "WHERE NOT EXISTS (SELECT 1 FROM note_sigs s WHERE s.note_id = n.id) "
+            "ORDER BY n.id LIMIT ?",
+            (limit,)
+        ).fetchall()
+        batch = {}
+        for note_id, content, chunk_map, kind in rows:
+            if chunk_map:
+                content = read_chunks(self.db.conn, chunks.unpack(chunk_map)).decode("utf-8")
+            else:
+                content = self.db.decode_text(content, kind)
+            batch[note_id] = content
+        if batch:
+            self._write(batch)
+        return len(batch)
+
+    def _write(self, batch: Dict[int, str]):
+        sigs, lsh = [], []
+        for note_id, content in batch.items():
+            sig = signature(content)
+            sigs.append((note_id, content_hash(content), sig))
+            if sig:
+                lsh += [(bucket, note_id) for bucket in buckets(sig)]
+        notes = [(note_id,) for note_id in batch]
+        with self.db.transaction():
+            self.db.executemany("DELETE FROM note_lsh WHERE note_id = ?", notes)
+            self.db.executemany("INSERT INTO note_sigs(note_id, hash, sig) VALUES(?, ?, ?) "
+                                "ON CONFLICT(note_id) DO UPDATE "
+                                "SET hash = excluded.hash, sig = excluded.sig",
+                                sigs)
+            self.db.executemany("INSERT OR IGNORE INTO note_lsh(bucket, note_id) VALUES(?, ?)",
+                                lsh)
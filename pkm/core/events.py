@@ -0,0 +1,62 @@
+# pkm/core/events.py
+"""Шина изменений данных.
+
+NoteService публикует события через Database.emit: внутри транзакции
+они копятся и уходят подписчикам только после коммита, при откате
+выбрасываются. Подписчики (список, календарь, напоминания, быстрый
+переход) правят у себя только то, чего касается событие.
+"""
+import traceback
+from collections import defaultdict
+from typing import Callable, List, NamedTuple, Optional
+
+NOTE_CREATED = "note-created"
+NOTE_UPDATED = "note-updated"
+NOTE_DELETED = "note-deleted"
+TAGS_CHANGED = "tags-changed"
+
+NOTE_EVENTS = (NOTE_CREATED, NOTE_UPDATED, NOTE_DELETED)
+
+
+class Event(NamedTuple):
+    kind: str
+    # Note до и после изменения (None, если её нет)
+    before: Optional[object]
+    after: Optional[object]
+
+    @property
+    def note_id(self) -> int:
+        return (self.after or self.before).id
+
+
+class EventBus:
+    def __init__(self):
+        self.handlers = defaultdict(list)
+        self.queued: List[Event] = []
+
+    def subscribe(self, callback: Callable[[Event], None], *kinds: str):
+        for kind in kinds:
+            self.handlers[kind].append(callback)
+
+    def unsubscribe(self, callback):
+        for handlers in self.handlers.values():
+            if callback in handlers:
+                handlers.remove(callback)
+
+    def post(self, event: Event):
+        self.queued.append(event)
+
+    def flush(self):
+        """Раздаёт накопленные события. Ошибка одного подписчика не
+        мешает остальным: запись уже в базе, а исключение из слота Qt
+        роняет всё приложение."""
+        events, self.queued = self.queued, []
+        for event in events:
+            for callback in list(self.handlers[event.kind]):
+                try:
+                    callback(event)
+                except Exception:
+                    traceback.print_exc()
+
+    def discard(self):
+        self.queued = []
@@ -0,0 +1,140 @@
+# pkm/core/instrument.py
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+SLOW_MS = 50
+SLOW_LOG = 200
+# границы корзин гистограммы задержек, мс
+BUCKETS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(sql: str) -> str:
+    """Текст запроса без литералов: одинаковые запросы попадают в одну строку."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDERS.sub("?, ...", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def explain(conn, sql: str, params=()):
+    try:
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    except sqlite3.Error:
+        return []
+
+
+def bucket(ms: float) -> int:
+    for i, bound in enumerate(BUCKETS):
+        if ms <= bound:
+            return i
+    return len(BUCKETS)
+
+
+class QueryStats:
+    """Счётчики запросов Database; пишутся из любого потока."""
+
+    def __init__(self, slow_ms: float = SLOW_MS):
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.queries = 0
+            self.rows = 0
+            self.total_ms = 0.0
+            self.commits = 0
+            self.rollbacks = 0
+            self.histogram = [0] * (len(BUCKETS) + 1)
+            self.by_sql = {}
+            self.slow = deque(maxlen=SLOW_LOG)
+
+    def record(self, sql: str, params, ms: float, rows: int, plan=None):
+        key = normalize(sql)
+        with self.lock:
+            self.queries += 1
+            self.rows += max(rows, 0)
+            self.total_ms += ms
+            self.histogram[bucket(ms)] += 1
+
+            entry = self.by_sql.get(key)
+            if entry is None:
+                entry = self.by_sql[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["rows"] += max(rows, 0)
+
+        if ms >= self.slow_ms:
+            # план снимаем вне блокировки: EXPLAIN сам идёт в базу
+            lines = plan() if plan else []
+            with self.lock:
+                self.slow.append({
+                    "time": time.time(),
+                    "sql": key,
+                    "params": repr(params)[:200],
+                    "ms": ms,
+                    "rows": rows,
+                    "plan": lines,
+                })
+
+    def commit(self):
+        with self.lock:
+            self.commits += 1
+
+    def rollback(self):
+        with self.lock:
+            self.rollbacks += 1
+
+    def top(self, n: int = 20, by: str = "total_ms"):
+        with self.lock:
+            items = [(sql, dict(e)) for sql, e in self.by_sql.items()]
+        items.sort(key=lambda item: item[1][by], reverse=True)
+        return items[:n]
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "queries": self.queries,
+                "rows": self.rows,
+                "total_ms": self.total_ms,
+                "commits": self.commits,
+                "rollbacks": self.rollbacks,
+                "histogram": list(self.histogram),
+                "slow": list(self.slow),
+                "uptime": time.time() - self.started,
+            }
+
+
+class Recorded:
+    """Уже выбранный результат запроса с интерфейсом курсора."""
+
+    def __init__(self, cur, rows):
+        self.rows = rows
+        self.pos = 0
+        self.lastrowid = cur.lastrowid
+        self.rowcount = cur.rowcount
+        self.description = cur.description
+
+    def fetchone(self):
+        if self.pos >= len(self.rows):
+            return None
+        self.pos += 1
+        return self.rows[self.pos - 1]
+
+    def fetchall(self):
+        rows = self.rows[self.pos:]
+        self.pos = len(self.rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
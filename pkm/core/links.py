@@ -0,0 +1,72 @@
+# pkm/core/links.py
+"""Вики-ссылки [[Заголовок]] между заметками.
+
+Ссылка хранится по тексту (target) и по найденной заметке (target_id).
+Заголовок ищется точным совпадением, из одноимённых берётся самая
+новая. При смене заголовка перепривязываются только ссылки на старое
+и новое имя -- через индекс по target, без чтения текстов.
+"""
+import re
+from typing import Iterable, List, Set, Tuple
+
+# [[Заголовок]], [[Заголовок|подпись]], [[Заголовок#раздел]]
+LINK = re.compile(r"\[\[([^\[\]\n|#]+)(?:[|#][^\[\]\n]*)?\]\]")
+MAX_TARGET = 200
+
+RESOLVE = ("(SELECT id FROM notes WHERE title = ? "
+           "ORDER BY created DESC, id DESC LIMIT 1)")
+
+
+def parse_links(content: str) -> Set[str]:
+    targets = set()
+    for m in LINK.finditer(content or ""):
+        target = " ".join(m.group(1).split())
+        if target and len(target) <= MAX_TARGET:
+            targets.add(target)
+    return targets
+
+
+class Links:
+    def __init__(self, db):
+        self.db = db
+
+    def update(self, note_id: int, content: str):
+        """Приводит исходящие ссылки заметки к тексту: только разница."""
+        wanted = parse_links(content)
+        current = {r[0] for r in self.db.execute(
+            "SELECT target FROM links WHERE source_id = ?",
+            (note_id,)
+        ).fetchall()}
+        with self.db.transaction():
+            self.db.executemany("DELETE FROM links WHERE source_id = ? AND target = ?",
+                                [(note_id, t) for t in current - wanted])
+            self.db.executemany("INSERT INTO links(source_id, target, target_id) "
+                                f"VALUES(?, ?, {RESOLVE})",
+                                [(note_id, t, t) for t in wanted - current])
+
+    def resolve(self, names: Iterable[str]):
+        """Перепривязывает ссылки на эти заголовки (новая заметка,
+        переименование, удаление)."""
+        self.db.executemany(f"UPDATE links SET target_id = {RESOLVE} WHERE target = ?",
+                            [(name, name) for name in names if name])
+
+    def backlinks(self, note_id: int) -> List[Tuple[int, str, str]]:
+        return self.db.execute("SELECT n.id, n.title, n.created FROM links l "
+                               "JOIN notes n ON n.id = l.source_id "
+                               "WHERE l.target_id = ? "
+                               "ORDER BY n.created DESC",
+                               (note_id,)
+                               ).fetchall()
+
+    def neighbors(self, note_id: int, limit: int = 50) -> List[Tuple[int, str, bool]]:
+        """Соседи в графе: (id, title, исходящая ли ссылка)."""
+        return self.db.execute(
+            "SELECT * FROM ("
+            " SELECT n.id, n.title, 1 FROM links l JOIN notes n ON n.id = l.target_id "
+            " WHERE l.source_id = ? LIMIT ?) "
+            "UNION "
+            "SELECT * FROM ("
+            " SELECT n.id, n.title, 0 FROM links l JOIN notes n ON n.id = l.source_id "
+            " WHERE l.target_id = ? LIMIT ?)",
+            (note_id, limit, note_id, limit)
+        ).fetchall()
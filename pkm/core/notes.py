@@ -0,0 +1,79 @@
+# pkm/core/notes.py
+from typing import List, Optional, Tuple
+
+from pkm.core.db import Database, Note
+from pkm.core.duplicates import Duplicates
+from pkm.core.events import NOTE_CREATED, NOTE_DELETED, NOTE_UPDATED, TAGS_CHANGED
+from pkm.core.links import Links
+from pkm.core.related import Related
+from pkm.core.revisions import Revisions
+
+# (до, после): None слева -- заметка создана, справа -- удалена
+Change = Tuple[Optional[Note], Optional[Note]]
+
+
+class NoteService:
+    """Сценарии сохранения и удаления заметок без привязки к GUI."""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.related = Related(db)
+        self.links = Links(db)
+        self.revisions = Revisions(db)
+        self.duplicates = Duplicates(db)
+
+    def find_duplicate(self, title: str, day: str) -> Optional[int]:
+        row = self.db.execute("SELECT id FROM notes "
+                              "WHERE title = ? AND created_date = ? LIMIT 1",
+                              (title, day)
+                              ).fetchone()
+        return row[0] if row else None
+
+    def save(self, note_id: Optional[int], title: str, content: str, tags,
+             remind_at: Optional[str] = None,
+             replace: Optional[int] = None,
+             rrule: Optional[str] = None) -> Tuple[int, List[Change]]:
+        """Сохраняет заметку одной транзакцией.
+
+        replace -- id заметки, которую новая заменяет (дубликат по дате);
+        rrule -- правило повтора напоминания (pkm.core.recur.make_rule).
+        """
+        changes = []
+        with self.db.transaction():
+            before = self.db.load_note(note_id) if note_id else None
+            previous = (before.title, self.db.note_text(before)) if before else None
+            note_id = self.db.save_note(note_id, title, content, tags, remind_at, rrule)
+            if replace:
+                # заменённая заметка удаляется, но её история, вместе
+                # с последней версией, переходит к новой
+                old = self.db.load_note(replace)
+                self.revisions.record(replace, old.title, self.db.note_text(old))
+                self.revisions.adopt(replace, note_id)
+                changes += self.delete(replace)
+            self.revisions.record(note_id, title, content, previous)
+            self.related.update(note_id, title, content, tags)
+            self.duplicates.update(note_id, content)
+            self.links.update(note_id, content)
+            if not before or before.title != title:
+                # на новое имя могли ссылаться раньше, старое освободилось
+                self.links.resolve({title, before.title if before else None})
+            after = self.db.load_note(note_id)
+            self._emit(before, after)
+        changes.append((before, after))
+        return note_id, changes
+
+    def delete(self, note_id: int) -> List[Change]:
+        before = self.db.load_note(note_id)
+        with self.db.transaction():
+            self.related.remove(note_id)
+            self.db.delete_note(note_id)
+            if before:
+                self.links.resolve({before.title})
+                self._emit(before, None)
+        return [(before, None)] if before else []
+
+    def _emit(self, before: Optional[Note], after: Optional[Note]):
+        kind = NOTE_UPDATED if before and after else NOTE_CREATED if after else NOTE_DELETED
+        self.db.emit(kind, before, after)
+        if set(before.tags if before else ()) != set(after.tags if after else ()):
+            self.db.emit(TAGS_CHANGED, before, after)
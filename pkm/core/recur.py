@@ -0,0 +1,69 @@
+# pkm/core/recur.py
+"""Повторяющиеся напоминания по правилам RRULE (RFC 5545).
+
+В reminders.rrule лежит правило вместе с DTSTART, а в remind_at --
+только ближайшее несработавшее повторение. Сработав, строка не
+помечается отправленной, а переезжает на следующее повторение: сколько
+бы раз правило ни срабатывало, строка одна, и поиск сработавших идёт
+по тому же индексу (mail_sent, remind_at).
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from dateutil.rrule import rrulestr
+
+# (подпись, правило без DTSTART)
+PRESETS = (
+    ("Не повторять", ""),
+    ("Каждый день", "FREQ=DAILY"),
+    ("По будням", "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"),
+    ("Каждую неделю", "FREQ=WEEKLY"),
+    ("Каждый месяц", "FREQ=MONTHLY"),
+    ("Каждый год", "FREQ=YEARLY"),
+)
+
+
+def make_rule(start: datetime, rule: str) -> Optional[str]:
+    """Текст для reminders.rrule или None без повтора.
+
+    ValueError, если правило не разбирается.
+    """
+    rule = rule.strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[6:]
+    if not rule:
+        return None
+    text = f"DTSTART:{start:%Y%m%dT%H%M%S}\nRRULE:{rule}"
+    _parse(text)
+    return text
+
+
+def rule_part(text: Optional[str]) -> str:
+    """Само правило, без DTSTART -- для редактора."""
+    for line in (text or "").splitlines():
+        if line.upper().startswith("RRULE:"):
+            return line[6:]
+    return ""
+
+
+@lru_cache(maxsize=256)
+def _parse(text: str):
+    return rrulestr(text)
+
+
+def next_after(text: str, moment: datetime, inc: bool = False) -> Optional[datetime]:
+    return _parse(text).after(moment, inc=inc)
+
+
+def last_before(text: str, moment: datetime) -> Optional[datetime]:
+    return _parse(text).before(moment, inc=True)
+
+
+def keep_rule(stored: Optional[str], stored_at: Optional[str], rule: str, at: str) -> bool:
+    """Повтор и дату в редакторе не трогали -- правило остаётся прежним.
+
+    Иначе пересохранение заметки брало бы показанное повторение за новый
+    DTSTART: серия сдвигалась бы, а счёт COUNT начинался заново.
+    """
+    return bool(stored) and stored_at == at and rule_part(stored) == rule.strip()
@@ -0,0 +1,241 @@
+# pkm/core/related.py
+"""Похожие заметки по TF-IDF.
+
+Вектор заметки -- до MAX_TERMS самых весомых термов с весом
+(1 + log tf) * idf, нормированный при сохранении. Он лежит в note_terms,
+а индекс (term_id, weight DESC) даёт постинги терма сразу в порядке
+убывания веса. Поиск берёт самые весомые термы заметки, читает у
+каждого верхушку постингов и складывает произведения весов через numpy;
+таблица заметок при этом не читается.
+
+idf меняется с каждой новой заметкой, а сохранённые веса -- нет:
+старые векторы чуть отстают, rebuild() пересчитывает всё заново.
+"""
+import array
+import heapq
+import json
+import math
+import re
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+from pkm.core.db import BATCH_SIZE, read_chunks
+from pkm.core import chunks
+
+MAX_TERMS = 64
+# сколько термов заметки и сколько постингов на терм берёт поиск
+QUERY_TERMS = 24
+POSTINGS = 400
+TITLE_BOOST = 3
+# длинный текст индексируется по началу
+TEXT_LIMIT = 256 * 1024
+WORD = re.compile(r"[^\W\d_]{3,}")
+
+
+def terms(title: str, content: str, tags) -> Counter:
+    counts = Counter(WORD.findall((content or "")[:TEXT_LIMIT].lower()))
+    for word in WORD.findall((title or "").lower()):
+        counts[word] += TITLE_BOOST
+    # тег -- один терм целиком, "тег1" и "тег2" не должны совпадать
+    for tag in tags:
+        if tag.strip():
+            counts["#" + tag.strip().lower()] += TITLE_BOOST
+    return counts
+
+
+def pack(ids) -> bytes:
+    return array.array("i", sorted(ids)).tobytes()
+
+
+def unpack(blob) -> set:
+    ids = array.array("i")
+    ids.frombytes(blob)
+    return set(ids)
+
+
+class Related:
+    def __init__(self, db):
+        self.db = db
+
+    def update(self, note_id: int, title: str, content: str, tags):
+        self._write({note_id: terms(title, content, tags)}, bump=True)
+
+    def remove(self, note_id: int):
+        """df термов заметки назад; сами векторы уходят каскадом."""
+        row = self.db.execute("SELECT terms FROM note_vectors WHERE note_id = ?",
+                              (note_id,)
+                              ).fetchone()
+        if row:
+            self.db.executemany("UPDATE terms SET df = df - 1 WHERE id = ?",
+                                [(t,) for t in unpack(row[0])])
+
+    def similar(self, note_id: int, k: int = 10) -> List[Tuple[int, str, str, float]]:
+        """(id, title, created, близость) для k самых похожих заметок."""
+        # numpy нужен только здесь, не тянем его на старте
+        import numpy as np
+
+        query = self.db.execute("SELECT term_id, weight FROM note_terms "
+                                "WHERE note_id = ? ORDER BY weight DESC LIMIT ?",
+                                (note_id, QUERY_TERMS)
+                                ).fetchall()
+        ids, weights = [], []
+        for term_id, weight in query:
+            rows = self.db.execute("SELECT note_id, weight FROM note_terms "
+                                   "WHERE term_id = ? ORDER BY weight DESC LIMIT ?",
+                                   (term_id, POSTINGS)
+                                   ).fetchall()
+            postings = np.fromiter(chain.from_iterable(rows), dtype=np.float64,
+                                   count=2 * len(rows)).reshape(-1, 2)
+            ids.append(postings[:, 0].astype(np.int64))
+            weights.append(postings[:, 1] * weight)
+        if not ids:
+            return []
+
+        candidates, where = np.unique(np.concatenate(ids), return_inverse=True)
+        scores = np.bincount(where, weights=np.concatenate(weights))
+        scores[candidates == note_id] = 0
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+        top = top[np.argsort(-scores[top])]
+        best = {int(candidates[i]): float(scores[i]) for i in top if scores[i] > 0}
+        if not best:
+            return []
+
+        marks = ", ".join("?" for _ in best)
+        rows = self.db.execute(f"SELECT id, title, created FROM notes WHERE id IN ({marks})",
+                               tuple(best)
+                               ).fetchall()
+        return sorted(((i, title, created, best[i]) for i, title, created in rows),
+                      key=itemgetter(3), reverse=True)
+
+    def backfill(self, limit: int = 500) -> int:
+        """Векторы для заметок, у которых их ещё нет. Возвращает, скольким построено."""
+        rows = self.db.execute(
+            "SELECT n.id, n.title, n.content, n.chunk_map, n.codec, "
+            "(SELECT json_group_array(t.name) FROM note_tags nt "
+            " JOIN tags t ON t.id = nt.tag_id WHERE nt.note_id = n.id) "
+            "FROM notes n WHERE NOT EXISTS "
+            "(SELECT 1 FROM note_vectors v WHERE v.note_id = n.id) "
+            "ORDER BY n.id LIMIT ?",
+            (limit,)
+        ).fetchall()
+        batch = {}
+        for note_id, title, content, chunk_map, kind, tags in rows:
+            if chunk_map:
+                content = read_chunks(self.db.conn, chunks.unpack(chunk_map)).decode("utf-8")
+            else:
+                content = self.db.decode_text(content, kind)
+            batch[note_id] = terms(title, content, json.loads(tags))
+        if batch:
+            self._write(batch, bump=True)
+        return len(batch)
+
+    def rebuild(self, notes, progress=None, chunk: int = 2000):
+        """Полный пересчёт: сначала df по всем заметкам, потом векторы.
+
+        notes -- вызываемый объект, дающий поток словарей как
+        transfer.iter_notes (его нужно пройти дважды).
+        """
+        with self.db.transaction():
+            self.db.execute("DELETE FROM note_terms")
+            self.db.execute("DELETE FROM note_vectors")
+            self.db.execute("DELETE FROM terms")
+
+        total = None
+        for count_only in (True, False):
+            batch = {}
+            done = 0
+            for note in notes():
+                batch[note["id"]] = terms(note["title"], note["content"], note["tags"])
+                if len(batch) >= chunk:
+                    done += self._pass(batch, count_only, total)
+                    if progress:
+                        progress(done)
+                    batch = {}
+            done += self._pass(batch, count_only, total)
+            if progress:
+                progress(done)
+            # во втором проходе idf считается от полного числа заметок
+            total = done
+
+    def _pass(self, batch, count_only: bool, total: Optional[int]) -> int:
+        if not batch:
+            return 0
+        if count_only:
+            with self.db.transaction():
+                ids = self._term_ids(set(chain.from_iterable(batch.values())))
+                delta = Counter(ids[t][0] for counts in batch.values() for t in counts)
+                self.db.executemany("UPDATE terms SET df = df + ? WHERE id = ?",
+                                    [(d, t) for t, d in delta.items()])
+        else:
+            self._write(batch, bump=False, total=total)
+        return len(batch)
+
+    def _term_ids(self, words) -> Dict[str, Tuple[int, int]]:
+        """{терм: (id, df)}, недостающие термы добавляются."""
+        words = sorted(words)
+        ids = {}
+        for i in range(0, len(words), BATCH_SIZE):
+            chunk = words[i:i + BATCH_SIZE]
+            values = ", ".join("(?)" for _ in chunk)
+            rows = self.db.execute(
+                f"INSERT INTO terms(term) VALUES {values} "
+                "ON CONFLICT(term) DO UPDATE SET term = excluded.term "
+                "RETURNING id, term, df",
+                tuple(chunk)
+            ).fetchall()
+            ids.update((term, (term_id, df)) for term_id, term, df in rows)
+        return ids
+
+    def _write(self, batch: Dict[int, Counter], bump: bool, total: Optional[int] = None):
+        with self.db.transaction():
+            found = self._term_ids(set(chain.from_iterable(batch.values())))
+            df = {term_id: count for term_id, count in found.values()}
+
+            old = {}
+            if bump:
+                notes = list(batch)
+                for i in range(0, len(notes), BATCH_SIZE):
+                    chunk = notes[i:i + BATCH_SIZE]
+                    marks = ", ".join("?" for _ in chunk)
+                    old.update((note_id, unpack(blob)) for note_id, blob in self.db.execute(
+                        f"SELECT note_id, terms FROM note_vectors WHERE note_id IN ({marks})",
+                        tuple(chunk)))
+                delta = Counter()
+                for note_id, counts in batch.items():
+                    new = {found[t][0] for t in counts}
+                    prev = old.get(note_id, set())
+                    delta.update(new - prev)
+                    delta.subtract(prev - new)
+                delta = {t: d for t, d in delta.items() if d}
+                self.db.executemany("UPDATE terms SET df = df + ? WHERE id = ?",
+                                    [(d, t) for t, d in delta.items()])
+                for t, d in delta.items():
+                    df[t] = df.get(t, 0) + d
+
+            if total is None:
+                # заметки пачки, у которых вектор уже есть, в count(*) уже вошли
+                total = self.db.execute("SELECT count(*) FROM note_vectors").fetchone()[0]
+                total += len(batch) - len(old)
+
+            rows, vectors = [], []
+            for note_id, counts in batch.items():
+                weights = {}
+                for term, tf in counts.items():
+                    term_id = found[term][0]
+                    idf = math.log((total + 1) / (df[term_id] + 1)) + 1
+                    weights[term_id] = (1 + math.log(tf)) * idf
+                top = heapq.nlargest(MAX_TERMS, weights.items(), key=itemgetter(1))
+                norm = math.sqrt(sum(w * w for _, w in top)) or 1.0
+                rows += [(note_id, term_id, w / norm) for term_id, w in top]
+                vectors.append((note_id, pack(weights)))
+
+            self.db.executemany("DELETE FROM note_terms WHERE note_id = ?",
+                                [(note_id,) for note_id in batch])
+            self.db.executemany("INSERT INTO note_terms(note_id, term_id, weight) "
+                                "VALUES(?, ?, ?)",
+                                rows)
+            self.db.executemany("INSERT INTO note_vectors(note_id, terms) VALUES(?, ?) "
+                                "ON CONFLICT(note_id) DO UPDATE SET terms = excluded.terms",
+                                vectors)
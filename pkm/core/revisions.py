@@ -0,0 +1,149 @@
+# pkm/core/revisions.py
+"""История версий заметок.
+
+Каждое сохранение -- ревизия: построчная дельта к предыдущей версии
+(копировать строки из старой / вставить новые байты), сжатая zlib.
+Каждая KEYFRAME_EVERY-я ревизия и та, дельта которой вышла не меньше
+половины текста, хранится целиком. Версия собирается от ближайшего
+полного снимка, поэтому чтение не дольше KEYFRAME_EVERY дельт, а запись
+сравнивает только с текущим текстом и от длины истории не зависит.
+"""
+import hashlib
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+KEYFRAME_EVERY = 32
+
+COPY = struct.Struct("<BII")    # 0, первая строка, сколько строк
+INSERT = struct.Struct("<BI")   # 1, длина байтов; дальше сами байты
+
+
+def digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def diff(old: List[bytes], new: List[bytes]) -> bytes:
+    """Дельта, превращающая строки old в строки new."""
+    first = {}
+    for i, line in enumerate(old):
+        first.setdefault(line, i)
+
+    out = bytearray()
+    start = count = 0
+    literal = []
+    for line in new:
+        if count and start + count < len(old) and old[start + count] == line:
+            count += 1
+            continue
+        found = first.get(line)
+        # короткую строку дешевле вставить, чем ссылаться на неё
+        if found is None or len(line) < COPY.size:
+            if count:
+                out += COPY.pack(0, start, count)
+                count = 0
+            literal.append(line)
+            continue
+        if count:
+            out += COPY.pack(0, start, count)
+        if literal:
+            data = b"".join(literal)
+            out += INSERT.pack(1, len(data)) + data
+            literal = []
+        start, count = found, 1
+
+    if count:
+        out += COPY.pack(0, start, count)
+    if literal:
+        data = b"".join(literal)
+        out += INSERT.pack(1, len(data)) + data
+    return bytes(out)
+
+
+def patch(old: List[bytes], delta: bytes) -> List[bytes]:
+    new = []
+    pos = 0
+    while pos < len(delta):
+        if delta[pos] == 0:
+            _, start, count = COPY.unpack_from(delta, pos)
+            new += old[start:start + count]
+            pos += COPY.size
+        else:
+            _, size = INSERT.unpack_from(delta, pos)
+            pos += INSERT.size
+            new += delta[pos:pos + size].splitlines(keepends=True)
+            pos += size
+    return new
+
+
+class Revisions:
+    def __init__(self, db):
+        self.db = db
+
+    def record(self, note_id: int, title: str, text: str,
+               previous: Optional[Tuple[str, str]] = None) -> Optional[int]:
+        """Записывает версию после сохранения.
+
+        previous -- (title, text) заметки до сохранения: у заметки без
+        истории он сам становится первой ревизией.
+        """
+        last = self.db.execute("SELECT id, seq, title, depth, digest FROM revisions "
+                               "WHERE note_id = ? ORDER BY seq DESC LIMIT 1",
+                               (note_id,)
+                               ).fetchone()
+        old = previous[1].encode("utf-8") if previous else None
+        old_key = digest(old) if previous else None
+        if last is None and previous:
+            last = self._insert(note_id, 1, previous[0], old, old_key, None, 0, old)
+
+        data = text.encode("utf-8")
+        key = digest(data)
+        if last and last[4] == key and last[2] == title:
+            return None
+
+        body, base, depth = data, None, 0
+        # дельта -- только если предыдущая ревизия и есть текст до сохранения
+        if last and last[4] == old_key and last[3] + 1 < KEYFRAME_EVERY:
+            delta = diff(old.splitlines(keepends=True), data.splitlines(keepends=True))
+            if len(delta) < len(data) // 2:
+                body, base, depth = delta, last[0], last[3] + 1
+        seq = last[1] + 1 if last else 1
+        return self._insert(note_id, seq, title, data, key, base, depth, body)[0]
+
+    def _insert(self, note_id, seq, title, data, key, base, depth, body):
+        revision_id = self.db.execute(
+            "INSERT INTO revisions(note_id, seq, created, title, base, depth, size, digest, data) "
+            "VALUES(?, ?, datetime('now'), ?, ?, ?, ?, ?, ?)",
+            (note_id, seq, title, base, depth, len(data), key, zlib.compress(body))
+        ).lastrowid
+        return revision_id, seq, title, depth, key
+
+    def adopt(self, old_id: int, new_id: int):
+        """История заменённой заметки переходит к заменившей её."""
+        self.db.execute("UPDATE revisions SET note_id = ? WHERE note_id = ?",
+                        (new_id, old_id))
+
+    def history(self, note_id: int) -> List[Tuple[int, int, str, str, int]]:
+        """(id, seq, created, title, size) от новых к старым, без текстов."""
+        return self.db.execute("SELECT id, seq, created, title, size FROM revisions "
+                               "WHERE note_id = ? ORDER BY seq DESC",
+                               (note_id,)
+                               ).fetchall()
+
+    def text(self, revision_id: int) -> str:
+        """Собирает версию: полный снимок и дельты после него."""
+        rows = self.db.execute(
+            "WITH RECURSIVE chain(id, base, depth, data) AS ("
+            " SELECT id, base, depth, data FROM revisions WHERE id = ? "
+            " UNION ALL "
+            " SELECT r.id, r.base, r.depth, r.data FROM revisions r "
+            " JOIN chain c ON r.id = c.base) "
+            "SELECT data FROM chain ORDER BY depth",
+            (revision_id,)
+        ).fetchall()
+        if not rows:
+            return ""
+        lines = zlib.decompress(rows[0][0]).splitlines(keepends=True)
+        for (delta,) in rows[1:]:
+            lines = patch(lines, zlib.decompress(delta))
+        return b"".join(lines).decode("utf-8")
@@ -0,0 +1,87 @@
+# pkm/core/schedule.py
+import heapq
+from datetime import datetime
+from typing import List, Optional
+
+DATE_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+def valid(remind_at) -> bool:
+    """Куча сравнивает строки, так что годится только время в DATE_FMT:
+    старые строки и импорт могут принести NULL или другой формат."""
+    if not isinstance(remind_at, str):
+        return False
+    try:
+        datetime.strptime(remind_at, DATE_FMT)
+    except ValueError:
+        return False
+    return True
+
+
+class ReminderQueue:
+    """Неотправленные напоминания в куче по времени срабатывания.
+
+    Изменения применяются точечно; устаревшие записи кучи выбрасываются
+    лениво, когда доходят до вершины.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.pending = {}
+        self.by_note = {}
+
+    def load(self, rows):
+        """rows -- (id, note_id, remind_at) из Database.pending_rems;
+        строки с негодным временем пропускаются."""
+        for rem_id, note_id, remind_at in rows:
+            if not valid(remind_at):
+                continue
+            self._add(rem_id, note_id, remind_at)
+            self.heap.append((remind_at, rem_id))
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def note_changed(self, before, after):
+        """before/after -- Note до и после сохранения (None, если её нет)."""
+        note_id = (after or before).id
+        for rem_id in list(self.by_note.get(note_id, ())):
+            self._drop(rem_id)
+        if after:
+            for rem_id, remind_at, sent, _ in after.rems:
+                if not sent and valid(remind_at):
+                    self._add(rem_id, note_id, remind_at)
+                    heapq.heappush(self.heap, (remind_at, rem_id))
+
+    def pop_due(self, now: str) -> List[int]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            remind_at, rem_id = heapq.heappop(self.heap)
+            if self._current(rem_id, remind_at):
+                due.append(rem_id)
+                self._drop(rem_id)
+        return due
+
+    def next_due(self) -> Optional[datetime]:
+        while self.heap and not self._current(self.heap[0][1], self.heap[0][0]):
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return datetime.strptime(self.heap[0][0], DATE_FMT)
+
+    def _current(self, rem_id, remind_at):
+        entry = self.pending.get(rem_id)
+        return entry is not None and entry[0] == remind_at
+
+    def _add(self, rem_id, note_id, remind_at):
+        self.pending[rem_id] = (remind_at, note_id)
+        self.by_note.setdefault(note_id, set()).add(rem_id)
+
+    def _drop(self, rem_id):
+        entry = self.pending.pop(rem_id, None)
+        if entry:
+            ids = self.by_note[entry[1]]
+            ids.discard(rem_id)
+            if not ids:
+                del self.by_note[entry[1]]
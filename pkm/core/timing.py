@@ -0,0 +1,34 @@
+# pkm/core/timing.py
+import json
+import os
+import sys
+import time
+
+
+class Startup:
+    """Отметки времени запуска в мс от создания объекта.
+
+    PKM_STARTUP=1 печатает итог в stderr, PKM_STARTUP=<файл> дописывает
+    строку JSON в файл, чтобы сравнивать запуски между коммитами.
+    """
+
+    def __init__(self, kind: str, start: float = None):
+        self.kind = kind
+        self.start = start if start is not None else time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name: str, since: float = None):
+        start = self.start if since is None else since
+        self.marks[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def report(self):
+        target = os.environ.get("PKM_STARTUP")
+        if not target:
+            return
+        line = json.dumps({"kind": self.kind, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                           **self.marks}, ensure_ascii=False)
+        if target == "1":
+            print(line, file=sys.stderr)
+        else:
+            with open(target, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
@@ -0,0 +1,236 @@
+# pkm/core/transfer.py
+import json
+import re
+from itertools import islice
+from pathlib import Path
+
+from pkm.core import chunks
+from pkm.core.db import read_chunks
+from pkm.core.links import Links, parse_links
+
+CHUNK = 2000
+# ключи шапки Markdown, которые понимает импорт
+FRONT_KEYS = ("title", "created", "tags", "reminders")
+
+
+def iter_notes(db, chunk: int = CHUNK):
+    """Все заметки с тегами и напоминаниями, постранично по id."""
+    last = 0
+    with db.reader() as conn:
+        while True:
+            rows = conn.execute("SELECT id, title, content, created, chunk_map, codec FROM notes "
+                                "WHERE id > ? ORDER BY id LIMIT ?",
+                                (last, chunk)
+                                ).fetchall()
+            if not rows:
+                return
+
+            first, last = rows[0][0], rows[-1][0]
+            tags = {}
+            for note_id, name in conn.execute(
+                    "SELECT nt.note_id, t.name FROM note_tags nt "
+                    "JOIN tags t ON t.id = nt.tag_id "
+                    "WHERE nt.note_id BETWEEN ? AND ?",
+                    (first, last)):
+                tags.setdefault(note_id, []).append(name)
+            rems = {}
+            for note_id, remind_at, sent, rrule in conn.execute(
+                    "SELECT note_id, remind_at, mail_sent, rrule FROM reminders "
+                    "WHERE note_id BETWEEN ? AND ? ORDER BY note_id, remind_at",
+                    (first, last)):
+                rems.setdefault(note_id, []).append(
+                    {"remind_at": remind_at, "sent": bool(sent), "rrule": rrule})
+
+            for note_id, title, content, created, chunk_map, kind in rows:
+                if chunk_map:
+                    content = read_chunks(conn, chunks.unpack(chunk_map)).decode("utf-8")
+                else:
+                    content = db.decode_text(content, kind)
+                yield {
+                    "id": note_id,
+                    "title": title,
+                    "content": content,
+                    "created": created,
+                    "tags": tags.get(note_id, []),
+                    "reminders": rems.get(note_id, []),
+                }
+
+
+def export_jsonl(db, path, progress=None) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for note in iter_notes(db):
+            f.write(json.dumps(note, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+            if progress and count % CHUNK == 0:
+                progress(count)
+    if progress:
+        progress(count)
+    return count
+
+
+def export_markdown(db, folder, progress=None) -> int:
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for note in iter_notes(db):
+        slug = re.sub(r"[^\w-]+", "-", note["title"] or "").strip("-")[:40]
+        meta = {k: note[k] for k in ("title", "created", "tags", "reminders")}
+        lines = ["---"]
+        lines += [f"{k}: {json.dumps(v, ensure_ascii=False)}" for k, v in meta.items()]
+        lines += ["---", note["content"] or ""]
+        path = folder / f"{note['id']:07d}-{slug}.md"
+        path.write_text("\n".join(lines), encoding="utf-8")
+        count += 1
+        if progress and count % CHUNK == 0:
+            progress(count)
+    if progress:
+        progress(count)
+    return count
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _front_value(value: str):
+    """Значение из шапки: JSON, как пишет export_markdown, иначе строка."""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value.strip().strip("'\"")
+
+
+def _front_matter(note: dict, head: str):
+    """Известные ключи шапки в заметку; чужие ключи пропускаются."""
+    last = None
+    for line in head.splitlines():
+        item = line.strip()
+        if item.startswith("- ") and last == "tags":
+            # список тегов столбиком, как пишут в YAML
+            note.setdefault("tags", []).append(item[2:].strip().strip("'\""))
+            continue
+        key, sep, value = line.partition(":")
+        key = last = key.strip()
+        if not sep or key not in FRONT_KEYS:
+            continue
+        value = _front_value(value.strip())
+        if key in ("title", "created"):
+            if value not in (None, ""):
+                note[key] = str(value)
+        elif key == "tags":
+            if isinstance(value, str):
+                value = value.strip("[]").split(",")
+            if isinstance(value, list):
+                note["tags"] = [str(t).strip().strip("'\"") for t in value if str(t).strip()]
+        elif key == "reminders":
+            if isinstance(value, list):
+                note["reminders"] = [r for r in value
+                                     if isinstance(r, dict) and isinstance(r.get("remind_at"), str)]
+
+
+def read_markdown(folder, skipped=None):
+    """Заметки из .md-файлов. Шапка --- ... --- необязательна: своя
+    (JSON-значения) или обычная YAML-подобная, понимаются только
+    FRONT_KEYS. Нечитаемый файл не прерывает импорт: он пропускается,
+    а skipped(путь, ошибка), если передан, узнаёт о нём."""
+    for path in sorted(Path(folder).glob("*.md")):
+        try:
+            text = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError) as e:
+            if skipped:
+                skipped(path, e)
+            continue
+        note = {"title": path.stem, "content": text}
+        if text.startswith("---\n"):
+            head, sep, body = text[4:].partition("\n---\n")
+            if sep:
+                _front_matter(note, head)
+                note["content"] = body
+        yield note
+
+
+def import_notes(db, notes, key: str = None, resume: bool = False,
+                 progress=None, chunk: int = CHUNK) -> int:
+    """Пишет заметки пачками по chunk в отдельных транзакциях.
+
+    key -- имя источника (путь к файлу): после каждой пачки в app_settings
+    запоминается, сколько записей уже импортировано, и по окончании
+    импорта запись удаляется. resume=True продолжает прерванный импорт
+    того же key с места остановки; без него импорт идёт с начала.
+    """
+    key = f"import:{key}" if key else None
+    notes = iter(notes)
+    done = 0
+    if key and resume:
+        row = db.execute("SELECT value FROM app_settings WHERE key = ?",
+                         (key,)).fetchone()
+        done = int(row[0]) if row else 0
+        notes = islice(notes, done, None)
+
+    while True:
+        batch = list(islice(notes, chunk))
+        if not batch:
+            break
+        with db.transaction():
+            _write_batch(db, batch)
+            done += len(batch)
+            if key:
+                db.execute("INSERT OR REPLACE INTO app_settings(key, value) "
+                           "VALUES(?, ?)",
+                           (key, str(done)))
+        if progress:
+            progress(done)
+    if key:
+        db.execute("DELETE FROM app_settings WHERE key = ?", (key,))
+    return done
+
+
+def _write_batch(db, batch):
+    names = {t.strip() for n in batch for t in n.get("tags") or () if t.strip()}
+    tag_ids = db.add_tags(sorted(names)) if names else {}
+
+    texts = [n.get("content") or "" for n in batch]
+    # кодируем только то, что может не влезть в порог (до 4 байт на символ)
+    data = {i: text.encode("utf-8") for i, text in enumerate(texts)
+            if len(text) * 4 > chunks.THRESHOLD}
+    big = {i for i, raw in data.items() if len(raw) > chunks.THRESHOLD}
+
+    with db.bulk_fts():
+        # id выдаёт SQLite: notes -- AUTOINCREMENT, и id удалённых заметок,
+        # на которые могли остаться ссылки, не достаются новым. Внутри
+        # транзакции пачка получает id подряд, последний -- в sqlite_sequence
+        # datetime() приводит дату из чужого файла к своему виду, мусор -- к NULL
+        db.executemany("INSERT INTO notes(title, content, created) "
+                       "VALUES(?, ?, coalesce(datetime(?), datetime('now')))",
+                       [(n.get("title") or "", None if i in big else text, n.get("created"))
+                        for i, (n, text) in enumerate(zip(batch, texts))])
+        last = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'notes'").fetchone()[0]
+        ids = range(last - len(batch) + 1, last + 1)
+        db.executemany("INSERT OR IGNORE INTO note_tags(note_id, tag_id) VALUES(?, ?)",
+                       [(note_id, tag_ids[t.strip()])
+                        for note_id, n in zip(ids, batch)
+                        for t in n.get("tags") or () if t.strip()])
+        # время напоминания -- так же через datetime(): очередь понимает
+        # только DATE_FMT, а без времени или с мусором строка не пишется
+        db.executemany("INSERT INTO reminders(note_id, remind_at, mail_sent, rrule) "
+                       "SELECT ?, datetime(?), ?, ? WHERE datetime(?) IS NOT NULL",
+                       [(note_id, r.get("remind_at"), int(bool(r.get("sent"))), r.get("rrule"),
+                         r.get("remind_at"))
+                        for note_id, n in zip(ids, batch)
+                        for r in n.get("reminders") or () if isinstance(r, dict)])
+        db.fill_fts(ids[0], ids[-1])
+        links = [(note_id, target)
+                 for note_id, text in zip(ids, texts)
+                 for target in parse_links(text)]
+        db.executemany("INSERT OR IGNORE INTO links(source_id, target) VALUES(?, ?)", links)
+        # новые ссылки и старые, что ждали заметку с таким заголовком
+        Links(db).resolve({target for _, target in links} | {n.get("title") for n in batch})
+        for i in sorted(big):
+            db.write_chunks(ids[i], chunks.split(data[i]))
+            db.execute("UPDATE notes_fts SET content = ? WHERE rowid = ?",
+                       (texts[i], ids[i]))
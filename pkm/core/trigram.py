@@ -0,0 +1,138 @@
+# pkm/core/trigram.py
+"""Нечёткий поиск по заголовкам заметок и тегам для быстрого перехода.
+
+Индекс целиком в памяти: на каждую триграмму -- array('i') номеров
+записей. Удаление ставит надгробие, изменение -- надгробие и новую
+запись в конец; когда мёртвых становится много, индекс пересобирается.
+Запрос: numpy.bincount по спискам триграмм запроса даёт число общих
+триграмм, из него -- коэффициент Жаккара; опечатка портит лишь две-три
+триграммы из многих, поэтому находится.
+"""
+import array
+import re
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# доля мёртвых записей, после которой индекс пересобирается
+COMPACT_AT = 0.3
+MIN_SCORE = 0.15
+PREFIX_BONUS = 0.3
+SUBSTRING_BONUS = 0.15
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.findall(r"\w+", (text or "").lower().replace("ё", "е")))
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Ключ записи -- ("note", id) или ("tag", имя)."""
+
+    def __init__(self):
+        self.keys: List[Optional[Hashable]] = []
+        self.labels: List[str] = []
+        self.texts: List[str] = []
+        self.sizes = array.array("H")
+        self.alive = bytearray()
+        self.postings: Dict[str, array.array] = {}
+        self.where: Dict[Hashable, int] = {}
+        self.dead = 0
+
+    @classmethod
+    def build(cls, notes: Iterable[Tuple[int, str]], tags: Iterable[str]) -> "TrigramIndex":
+        index = cls()
+        for note_id, title in notes:
+            index.add(("note", note_id), title)
+        for name in tags:
+            index.add(("tag", name), name)
+        return index
+
+    def __len__(self):
+        return len(self.where)
+
+    def add(self, key, label: str):
+        if key in self.where:
+            self.remove(key)
+        text = normalize(label)
+        grams = trigrams(text)
+        entry = len(self.keys)
+        self.keys.append(key)
+        self.labels.append(label or "")
+        self.texts.append(text)
+        self.sizes.append(min(len(grams), 0xFFFF))
+        self.alive.append(1)
+        self.where[key] = entry
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array.array("i")
+            posting.append(entry)
+
+    def remove(self, key):
+        entry = self.where.pop(key, None)
+        if entry is None:
+            return
+        self.alive[entry] = 0
+        self.keys[entry] = None
+        self.dead += 1
+        if self.dead > COMPACT_AT * len(self.keys) and len(self.keys) > 1000:
+            self.compact()
+
+    def compact(self):
+        fresh = TrigramIndex()
+        for key, label, alive in zip(self.keys, self.labels, self.alive):
+            if alive:
+                fresh.add(key, label)
+        self.__dict__.update(fresh.__dict__)
+
+    def note_changed(self, before, after):
+        """before/after -- Note до и после изменения (None, если её нет)."""
+        if before and (not after or before.title != after.title):
+            self.remove(("note", before.id))
+        if after and (not before or before.title != after.title):
+            self.add(("note", after.id), after.title)
+
+    def tags_changed(self, before, after):
+        """Новые теги заметки попадают в индекс; пустые теги база не
+        удаляет, поэтому и здесь они остаются."""
+        for name in after.tags if after else ():
+            if ("tag", name) not in self.where:
+                self.add(("tag", name), name)
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[Hashable, str, float]]:
+        """(ключ, подпись, оценка) по убыванию оценки, без единого SQL."""
+        import numpy as np
+
+        text = normalize(query)
+        grams = trigrams(text) if text else set()
+        lists = [np.frombuffer(self.postings[g], dtype=np.int32)
+                 for g in grams if g in self.postings]
+        if not lists:
+            return []
+
+        total = len(self.keys)
+        hits = np.bincount(np.concatenate(lists), minlength=total)
+        sizes = np.frombuffer(self.sizes, dtype=np.uint16)
+        alive = np.frombuffer(self.alive, dtype=np.uint8)
+        scores = hits / (len(grams) + sizes - hits) * alive
+        del lists, sizes, alive
+
+        wide = min(limit * 4, total)
+        best = np.argpartition(-scores, wide - 1)[:wide]
+        results = []
+        for entry in best.tolist():
+            score = float(scores[entry])
+            if score <= 0:
+                continue
+            # точное начало и вхождение важнее, чем просто похожесть
+            if self.texts[entry].startswith(text):
+                score += PREFIX_BONUS
+            elif text in self.texts[entry]:
+                score += SUBSTRING_BONUS
+            if score >= MIN_SCORE:
+                results.append((self.keys[entry], self.labels[entry], score))
+        results.sort(key=lambda r: (-r[2], len(r[1])))
+        return results[:limit]
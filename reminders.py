@@ -1,7 +1,14 @@
-from PyQt6.QtCore import QTimer, QObject, QUrl
-from PyQt6.QtMultimedia import QSoundEffect
-from PyQt6.QtWidgets import QMessageBox
+import sqlite3
+
+from PyQt6.QtCore import QTimer, QObject, QUrl, Qt
 from datetime import datetime
+from pkm.core.events import NOTE_EVENTS
+from pkm.core.schedule import ReminderQueue, DATE_FMT
+
+# даже без напоминаний таймер просыпается раз в час: переживает сон и перевод часов
+MAX_WAIT_MS = 3_600_000
+# напоминания, пришедшие в пределах окна, показываются одной сводкой
+COALESCE_MS = 500
 
 
 class Reminder(QObject):
@@ -9,50 +16,81 @@ class Reminder(QObject):
         super().__init__(parent)
         self.db = db
         self.parent = parent
+        self.queue = ReminderQueue()
+        self.loaded = False
 
-        self.sound = QSoundEffect()
-        self.sound.setSource(QUrl.fromLocalFile("sounds/notify.wav"))
-        self.sound.setVolume(1.0)
+        # звук и панель создаются при первом срабатывании: QtMultimedia
+        # заметно замедляет запуск
+        self.sound = None
+        self.panel = None
+        self.due = []
 
-        self.timer = QTimer()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.timer.timeout.connect(self.check)
-        self.timer.start(60_000)
 
-        QTimer.singleShot(2000, self.check)
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(COALESCE_MS)
+        self.flush_timer.timeout.connect(self._flush)
+
+        db.events.subscribe(self.on_event, *NOTE_EVENTS)
+
+        QTimer.singleShot(2000, self.start)
+
+    def start(self):
+        if not self.loaded:
+            self.queue.load(self.db.pending_rems())
+            self.loaded = True
+        self.check()
+
+    def on_event(self, event):
+        self.queue.note_changed(event.before, event.after)
+        if self.loaded:
+            self._arm()
 
     def check(self):
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        due = self.queue.pop_due(datetime.now().strftime(DATE_FMT))
+        if due:
+            # сработавшими они отмечаются в _flush, когда их уже видно:
+            # закрой приложение до сводки -- покажутся при следующем запуске
+            self.due.extend(self.db.get_rems_by_id(due))
+            if not self.flush_timer.isActive():
+                self.flush_timer.start()
 
-        sql = """
-        SELECT r.id, r.note_id, r.remind_at, n.title
-        FROM reminders r
-        LEFT JOIN notes n ON r.note_id = n.id
-        WHERE r.mail_sent = 0 AND r.remind_at <= ?
-        ORDER BY r.remind_at ASC
-        """
+        self._arm()
 
-        rows = self.db.execute(sql, (now,)).fetchall()
+    def _arm(self):
+        wait = MAX_WAIT_MS
+        due = self.queue.next_due()
+        if due:
+            delta = (due - datetime.now()).total_seconds() * 1000
+            wait = max(0, min(wait, int(delta) + 1))
+        self.timer.start(wait)
 
-        for rem_id, note_id, remind_at, title in rows:
-            self._alert(title, remind_at)
-            self._mark_sent(rem_id)
+    def _flush(self):
+        if not self.due:
+            return
 
-    def _alert(self, title: str, remind_at: str):
-        self.sound.play()
+        # пока ждали сводку, правка заметки могла вернуть напоминание в очередь
+        rows = list({r[0]: r for r in self.due}.values())
+        self.due = []
+        if self.panel is None:
+            from origin.notify import ReminderPanel
+            from PyQt6.QtMultimedia import QSoundEffect
 
-        msg = QMessageBox(self.parent)
-        msg.setWindowTitle("Напоминание")
-        msg.setText(
-                    f"Напоминание по заметке:\n\n"
-                    f"{title}\n\n"
-                    f"Время: {remind_at}"
-                )
-        msg.setIcon(QMessageBox.Icon.Information)
-        msg.exec()
-
-    def _mark_sent(self, rem_id: int):
-        self.db.execute("UPDATE reminders "
-                        "SET mail_sent = 1 "
-                        "WHERE id = ?",
-                        (rem_id,)
-                        )
+            self.panel = ReminderPanel(self.parent)
+            self.sound = QSoundEffect(self)
+            self.sound.setSource(QUrl.fromLocalFile("sounds/notify.wav"))
+            self.sound.setVolume(1.0)
+        self.panel.add(rows)
+        self.panel.show()
+        self.panel.raise_()
+        self.sound.play()
+        try:
+            # повторяющиеся вернутся в очередь следующим повторением через шину
+            self.db.fire_rems([r[0] for r in rows], datetime.now())
+        except sqlite3.OperationalError:
+            # база занята: неотмеченные покажутся ещё раз при запуске
+            pass